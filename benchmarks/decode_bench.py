@@ -0,0 +1,72 @@
+"""
+Compares full json decoding with the projected decoders on list payloads:
+a search/tweets page, a favorites/list page and a followers/list page.
+
+usage: python -m benchmarks.decode_bench [pages] [recorded search payload]
+
+without a recorded payload, synthetic ones shaped like the v1.1 objects
+are used (see mockapi.payloads)
+"""
+import json
+import sys
+import time
+import tracemalloc
+from network.projection import decode_search, decode_tweets
+from network.projection import decode_users_page
+from mockapi.payloads import synthetic_tweet, synthetic_user
+
+
+def payloads(recorded=None):
+    """
+    (name, bytes, decoder, full decode to compare with)
+    """
+    search = {"statuses": [synthetic_tweet(10**18 + i, 10**9 + i)
+                           for i in range(100)],
+              "search_metadata": {"count": 100}}
+    search_bytes = json.dumps(search).encode("utf-8")
+    if recorded:
+        with open(recorded, 'rb') as f_recorded:
+            search_bytes = f_recorded.read()
+    favorites = [synthetic_tweet(10**18 + i, 10**9 + i) for i in range(200)]
+    users = {"users": [synthetic_user(10**9 + i) for i in range(200)],
+             "next_cursor": 0, "previous_cursor": 0}
+    return (
+        ("search/tweets", search_bytes, decode_search),
+        ("favorites/list", json.dumps(favorites).encode("utf-8"),
+         decode_tweets),
+        ("followers/list", json.dumps(users).encode("utf-8"),
+         decode_users_page),
+    )
+
+
+def measure(decode, content, pages):
+    """
+    decode `pages` copies of a payload, keeping every result (as purge
+    does), returns (seconds, peak MiB)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = [decode(content) for _ in range(pages)]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return (elapsed, peak / 1024 / 1024)
+
+
+def main(pages=50, recorded=None):
+    """
+    run every payload through both decoders
+    """
+    for name, content, decoder in payloads(recorded):
+        full = measure(json.loads, content, pages)
+        projected = measure(decoder, content, pages)
+        print(f'{name:>15} x{pages} ({len(content) // 1024} KiB/page): '
+              f'full {full[0] * 1000:7.1f} ms {full[1]:6.1f} MiB | '
+              f'projected {projected[0] * 1000:7.1f} ms '
+              f'{projected[1]:6.1f} MiB')
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+         sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,264 @@
+"""
+Benchmarks of the purge, create and tweet entry points against the
+in-process stand-in (mockapi), with every sleep virtualized.
+
+Each scenario runs twice, each time in a process of its own: untraced
+for wall time (and the part of it spent outside the stand-in), requests,
+bytes, peak RSS and the virtual time spent waiting on rate limits, then
+under tracemalloc for the allocation peak (so neither the tracing
+overhead nor another scenario shows up in the RSS).  Results are appended as
+json lines, and can be compared with an earlier results file.
+
+usage:
+    python -m benchmarks.hotpaths                    # every scenario
+    python -m benchmarks.hotpaths purge_50k tweet_10k
+    python -m benchmarks.hotpaths --save benchmarks/results.jsonl
+    python -m benchmarks.hotpaths --compare benchmarks/results.jsonl
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# scenario: (job, options)
+SCENARIOS = {
+    "purge_1k": ("purge", {"friends": 1000, "followers": 1000}),
+    "purge_50k": ("purge", {"friends": 50000, "followers": 50000}),
+    "purge_500k": ("purge", {"friends": 500000, "followers": 500000}),
+    "create": ("create", {"friends": 1000, "followers": 1000}),
+    "tweet_10k": ("tweet", {"backlog": 10000}),
+}
+# share of friends following back (keeps unfollows small, paging dominates)
+FOLLOW_BACK = 0.99
+REGRESSION_RATIO = 1.2
+
+
+class VirtualClock:
+    """
+    time that only moves when someone sleeps
+    """
+
+    def __init__(self):
+        self.now = time.time()
+        self.waited = 0.0
+
+    def time(self):
+        """
+        current virtual time
+        """
+        return self.now
+
+    def sleep(self, seconds):
+        """
+        advance instead of sleeping
+        """
+        self.now = self.now + seconds
+        self.waited = self.waited + seconds
+
+
+def build(options, clock):
+    """
+    the stand-in session wrapped like ActionScheduler wraps the real one
+    """
+    # imported here so the .env/constants are read inside the scenario's
+    # working directory
+    from mockapi.server import Graph
+    from mockapi.session import StandInSession
+    from network.cache import CachedSession
+    from network.executor import RetryingSession
+    from network.ratelimit import RateGovernor, RateLimitedSession
+    graph = Graph(options.get("friends", 100), options.get("followers", 100),
+                  FOLLOW_BACK, seed=0)
+    stand_in = StandInSession(graph)
+    governor = RateGovernor(clock=clock.time, sleep=clock.sleep)
+    session = CachedSession(RetryingSession(
+        RateLimitedSession(stand_in, governor), sleep=clock.sleep))
+    return (stand_in, session)
+
+
+def prepare_tweets(backlog):
+    """
+    a picture and a tweets.json backlog in the working directory
+    """
+    os.makedirs("cached/tweets", exist_ok=True)
+    os.makedirs("resources/pictures", exist_ok=True)
+    with open("resources/pictures/bench.jpg", 'wb') as f_picture:
+        # a jpeg signature followed by filler, the upload doesn't decode it
+        f_picture.write(b'\xff\xd8\xff\xe0' + os.urandom(256 * 1024))
+    tweets = [{"img": "bench.jpg", "text": f'benchmark tweet {index}'}
+              for index in range(backlog)]
+    with open("cached/tweets/tweets.json", 'w') as f_tweets:
+        json.dump(tweets, f_tweets, indent=4)
+
+
+def run_job(job, options, clock):
+    """
+    run the entry point once, returns the stand-in session (for counters)
+    """
+    stand_in, session = build(options, clock)
+    if job == "tweet":
+        from tweet import mediacache
+        from tweet.tweetservice import TweetService
+        # measure the posting path, not Pillow
+        mediacache.Image = None
+        prepare_tweets(options["backlog"])
+        service = TweetService(session)
+        for _ in range(options.get("posts", 5)):
+            service.tweet()
+    else:
+        from users.friendshipservice import FriendshipService
+        service = FriendshipService(session)
+        getattr(service, job)()
+    return stand_in
+
+
+def run_scenario(name):
+    """
+    run one scenario in a scratch directory (called in the child process)
+    """
+    job, options = SCENARIOS[name]
+    os.environ.setdefault("auth_user_screen_name", "benchmark")
+    with tempfile.TemporaryDirectory(prefix=f'bench-{name}-') as scratch:
+        os.chdir(scratch)
+        clock = VirtualClock()
+        started = time.perf_counter()
+        stand_in = run_job(job, options, clock)
+        wall = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "version": git_version(),
+        "timestamp": int(time.time()),
+        "wall_seconds": round(wall, 3),
+        "client_seconds": round(wall - stand_in.server_seconds, 3),
+        "virtual_wait_seconds": round(clock.waited, 1),
+        "requests": stand_in.requests,
+        "bytes_sent": stand_in.bytes_sent,
+        "bytes_received": stand_in.bytes_received,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def trace_scenario(name):
+    """
+    run one scenario under tracemalloc (called in a child process of its
+    own, the tracing inflates RSS), after an untraced run so imports and
+    module level caches aren't counted
+    """
+    job, options = SCENARIOS[name]
+    os.environ.setdefault("auth_user_screen_name", "benchmark")
+    with tempfile.TemporaryDirectory(prefix=f'bench-{name}-') as scratch:
+        os.chdir(scratch)
+        run_job(job, options, VirtualClock())
+    with tempfile.TemporaryDirectory(prefix=f'bench-{name}-') as scratch:
+        os.chdir(scratch)
+        tracemalloc.start()
+        run_job(job, options, VirtualClock())
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "alloc_peak_bytes": traced_peak,
+        "alloc_retained_bytes": traced_current,
+    }
+
+
+def git_version():
+    """
+    the commit being benchmarked, if this is a git checkout
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def spawn(name):
+    """
+    run a scenario in child processes (plain, then traced), returns its
+    result
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    result = {}
+    for mode in ("--child", "--traced"):
+        output = subprocess.check_output(
+            [sys.executable, "-m", "benchmarks.hotpaths", mode, name],
+            cwd=root, env=env)
+        result.update(
+            json.loads(output.decode("utf-8").strip().splitlines()[-1]))
+    return result
+
+
+def compare(results, previous_path):
+    """
+    print the change against the latest earlier result of each scenario
+    """
+    previous = {}
+    with open(previous_path, 'r') as f_previous:
+        for line in f_previous:
+            if line.strip():
+                result = json.loads(line)
+                previous[result["scenario"]] = result
+    for result in results:
+        before = previous.get(result["scenario"])
+        if before is None:
+            continue
+        for key in ("client_seconds", "requests", "bytes_received",
+                    "peak_rss_kb", "alloc_peak_bytes"):
+            if not before.get(key):
+                continue
+            ratio = result[key] / before[key]
+            flag = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+            print(f'{result["scenario"]:>12} {key:>18}: '
+                  f'{before[key]} -> {result[key]} ({ratio:.2f}x){flag}')
+
+
+def main(argv=None):
+    """
+    run the selected scenarios and report
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS))
+    parser.add_argument("--save", metavar="JSONL")
+    parser.add_argument("--compare", metavar="JSONL")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--traced", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child)))
+        return
+    if args.traced:
+        print(json.dumps(trace_scenario(args.traced)))
+        return
+
+    results = []
+    for name in args.scenarios:
+        result = spawn(name)
+        results.append(result)
+        print(f'{name:>12}: {result["wall_seconds"]:8.2f}s '
+              f'({result["client_seconds"]:.2f}s client) '
+              f'{result["requests"]:7} requests '
+              f'{result["bytes_received"] / 1024 / 1024:8.1f} MiB in '
+              f'rss {result["peak_rss_kb"] / 1024:7.1f} MiB '
+              f'alloc peak {result["alloc_peak_bytes"] / 1024 / 1024:7.1f} MiB '
+              f'(waited {result["virtual_wait_seconds"]}s virtual)')
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.save:
+        with open(args.save, 'a') as f_results:
+            for result in results:
+                f_results.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compares memory and time of the friend/follower diff:
+the old set-of-user-dicts approach vs IdSet
+
+usage: python -m benchmarks.idset_bench [friends] [followers]
+"""
+import random
+import sys
+import time
+import tracemalloc
+from users.idset import IdSet
+
+
+def synthetic_ids(friends, followers):
+    """
+    two overlapping id populations, roughly the shape of a real graph
+    """
+    population = random.sample(range(1, 2**40), friends + followers)
+    friend_ids = population[:friends]
+    # about half of the friends follow back
+    follower_ids = population[friends:] + friend_ids[:friends // 2]
+    return (friend_ids, follower_ids)
+
+
+def set_of_dicts(friend_ids, follower_ids):
+    """
+    the original purge(): full user dicts, then two sets of ints
+    """
+    friends = [{"id": user_id, "screen_name": f'user{user_id}'}
+               for user_id in friend_ids]
+    followers = [{"id": user_id, "screen_name": f'user{user_id}'}
+                 for user_id in follower_ids]
+    friend_set = set(map(lambda user: user['id'], friends))
+    follower_set = set(map(lambda user: user['id'], followers))
+    return (friends, followers, friend_set - follower_set)
+
+
+def id_sets(friend_ids, follower_ids):
+    """
+    purge() with IdSet
+    """
+    friend_set = IdSet(friend_ids)
+    follower_set = IdSet(follower_ids)
+    return (friend_set, follower_set, friend_set - follower_set)
+
+
+def measure(name, func, *args):
+    """
+    run func once, report wall time and peak traced memory
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:>14}: {elapsed * 1000:9.1f} ms  '
+          f'peak {peak / 1024 / 1024:8.1f} MiB  '
+          f'{len(result[2])} to unfollow')
+    return result
+
+
+def main(friends=200000, followers=200000):
+    """
+    run both approaches on the same synthetic graph
+    """
+    friend_ids, follower_ids = synthetic_ids(friends, followers)
+    print(f'{friends} friends, {len(follower_ids)} followers')
+    old = measure("set of dicts", set_of_dicts, friend_ids, follower_ids)
+    new = measure("IdSet", id_sets, friend_ids, follower_ids)
+    assert sorted(old[2]) == list(new[2])
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,88 @@
+"""
+Per request overhead of the default OAuth1Session against the one from
+network.sessionfactory: signing (no network), and a job's first request
+on a cold pool against a warmed one (over a local mockapi stand-in).
+
+usage: python -m benchmarks.session_bench [requests]
+"""
+import sys
+import threading
+import time
+from requests import Request
+from requests_oauthlib import OAuth1Session
+from mockapi.server import make_server, parse_args
+from network.sessionfactory import make_session, warm_up
+
+CREDENTIALS = ("consumer-key", "consumer-secret", "token", "token-secret")
+URL = "https://api.twitter.com/1.1/friendships/create.json?user_id=1234567"
+
+
+def default_session(_root, _upload):
+    """
+    what main() used to build
+    """
+    consumer_key, consumer_secret, token, token_secret = CREDENTIALS
+    return OAuth1Session(
+        consumer_key,
+        client_secret=consumer_secret,
+        resource_owner_key=token,
+        resource_owner_secret=token_secret)
+
+
+def factory_session(root, upload):
+    """
+    network.sessionfactory's session
+    """
+    return make_session(*CREDENTIALS, root_url=root, upload_url=upload)
+
+
+def signing(build, count):
+    """
+    microseconds to prepare (and sign) one request
+    """
+    session = build("https://api.twitter.com", "https://upload.twitter.com")
+    started = time.perf_counter()
+    for _ in range(count):
+        session.prepare_request(Request("POST", URL))
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def first_request(build, base, warmed):
+    """
+    milliseconds for a job's first request, on a new session
+    """
+    session = build(base, base)
+    if warmed:
+        warm_up(session, urls=(base,))
+    started = time.perf_counter()
+    session.get(f'{base}/1.1/application/rate_limit_status.json')
+    elapsed = time.perf_counter() - started
+    session.close()
+    return elapsed * 1e3
+
+
+def main():
+    """
+    print both measurements for both sessions
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for name, build in (("default", default_session),
+                        ("factory", factory_session)):
+        print(f'{name:>8} signing: {signing(build, count):7.1f} us/request')
+
+    server = make_server(parse_args(["--port", "0"]))
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    for name, build in (("default", default_session),
+                        ("factory", factory_session)):
+        for warmed in (False, True):
+            samples = sorted(first_request(build, base, warmed)
+                             for _ in range(50))
+            label = "warmed" if warmed else "cold"
+            print(f'{name:>8} first request ({label}): '
+                  f'{samples[len(samples) // 2]:6.2f} ms median')
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Start-up time of the CLI: `main.py --help`, `main.py dry-run`, and the
+imports each one-shot job needs before it can send its first request.
+Each is run in a fresh interpreter several times, the median is kept.
+
+usage:
+    python -m benchmarks.startup_bench
+    python -m benchmarks.startup_bench --save benchmarks/startup.jsonl
+
+Exits with 1 when a measurement is over its budget, so it can gate a
+change the way a test would.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+RUNS = 7
+# name: (python arguments, budget in milliseconds)
+MEASUREMENTS = {
+    "help": (["main.py", "--help"], 150),
+    "dry-run": (["main.py", "dry-run"], 600),
+    "create imports": (["-c", "import main, network.sessionfactory, "
+                              "users.friendshipservice"], 600),
+    "tweet imports": (["-c", "import main, network.sessionfactory, "
+                             "tweet.tweetservice"], 600),
+    "run imports": (["-c", "import main, network.sessionfactory, "
+                           "jobscheduler.actionscheduler"], 700),
+}
+
+
+def measure(arguments, root):
+    """
+    median wall time (ms) of a fresh interpreter running the arguments
+    """
+    samples = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, cwd=root,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=False)
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+
+def main(argv=None):
+    """
+    measure, report, and fail on a blown budget
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--save", metavar="JSONL")
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    baseline = measure(["-c", "pass"], root)
+    print(f'{"interpreter":>15}: {baseline:7.1f} ms')
+    result = {"timestamp": int(time.time()), "interpreter_ms": baseline}
+    over = []
+    for name, (arguments, budget) in MEASUREMENTS.items():
+        elapsed = measure(arguments, root)
+        result[f'{name}_ms'] = round(elapsed, 1)
+        flag = ""
+        if elapsed > budget:
+            flag = f'  OVER BUDGET ({budget} ms)'
+            over.append(name)
+        print(f'{name:>15}: {elapsed:7.1f} ms{flag}')
+
+    if args.save:
+        with open(args.save, 'a') as f_results:
+            f_results.write(json.dumps(result) + "\n")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
 """
 encapsulates scheduling related to actions
 """
-import time
-import schedule
-
+from jobscheduler import locks
+from jobscheduler.eventscheduler import EventScheduler, Job
+from jobscheduler.profiling import JobProfiler
+from network.sessionfactory import job_session, warm_up
+from static import metrics
 from tweet.tweetservice import TweetService
 from users.friendshipservice import FriendshipService
 
@@ -13,7 +15,18 @@ class ActionScheduler:  # pylint: disable=too-few-public-methods
     schedules twitter actions
     """
 
-    def __init__(self, session):
+    def __init__(self, session, warm_up_connections=True, profiler=None):
+        """
+        warm_up_connections: reopen the connections to twitter before each
+        job, since jobs run hours apart and idle connections get closed
+        profiler: profiles the jobs it's switched on for (see
+        jobscheduler/profiling.py), from the .env's profile_jobs if not given
+        """
+        self.raw_session = session
+        self.warm_up_connections = warm_up_connections
+        self.profiler = profiler if profiler is not None else JobProfiler()
+        # cached, retried, rate limited and metered (see job_session)
+        session = job_session(session)
         self.tweetservice = TweetService(session)
         self.friendshipservice = FriendshipService(session)
 
@@ -21,65 +34,65 @@ class ActionScheduler:  # pylint: disable=too-few-public-methods
         """
         talks to friendship service to make new friends
         """
-        self.friendshipservice.create()
+        self.__run("create", self.friendshipservice.create, exclusive=True)
 
     def __purge(self):
         """
         talks to friendship service to remove friends who have not
-        followed back
+        followed back (friends and followers are paged concurrently)
         """
-        self.friendshipservice.purge()
+        self.__run("purge", self.friendshipservice.purge, exclusive=True)
 
     def __tweet(self):
         """
         talks to tweet service tp issue a brand new tweet
         """
-        self.tweetservice.tweet()
+        self.__run("tweet", self.tweetservice.tweet)
 
-    def execute(self):
+    def __prefetch(self):
         """
-        starts the scheduler.  Here's the schedule:
-
-        c = create
-        p = purge
-        t = tweet
-
-        SCHEDULE
-        S M T W Th F S
-        c p c   c    c
-        c   c   c    c
-        c p c p c  p c
-        t t t t t  t t
-
-        Using this scheduler:
-        https://schedule.readthedocs.io/en/stable/
+        talks to tweet service to upload the next tweets' media ahead
+        of time
         """
-        # schedule the friendships (100 friends, 3 times a day)
-        schedule.every().sunday.at("09:00").do(self.__create)
-        schedule.every().sunday.at("15:00").do(self.__create)
-        schedule.every().sunday.at("21:00").do(self.__create)
-
-        schedule.every().tuesday.at("09:00").do(self.__create)
-        schedule.every().tuesday.at("15:00").do(self.__create)
-        schedule.every().tuesday.at("21:00").do(self.__create)
+        self.__run("prefetch", self.tweetservice.prefetch)
 
-        schedule.every().thursday.at("09:00").do(self.__create)
-        schedule.every().thursday.at("15:00").do(self.__create)
-        schedule.every().thursday.at("21:00").do(self.__create)
-
-        schedule.every().saturday.at("09:00").do(self.__create)
-        schedule.every().saturday.at("15:00").do(self.__create)
-        schedule.every().saturday.at("21:00").do(self.__create)
-
-        # schedule purge friends (600 removals max)
-        schedule.every().monday.at("02:00").do(self.__purge)
-        schedule.every().monday.at("18:30").do(self.__purge)
-        schedule.every().wednesday.at("22:00").do(self.__purge)
-        schedule.every().friday.at("22:00").do(self.__purge)
-
-        # schedule to post a tweet once a day (every day at 1PM)
-        schedule.every().day.at("13:00").do(self.__tweet)
+    def __run(self, job, func, exclusive=False):
+        """
+        open the connections the job is about to use, then run it
+        (profiled, if that's switched on for it)
+        exclusive: hold the friendships lock while it runs, waiting for a
+        one-shot create/purge (cron) to finish first
+        """
+        lock = locks.acquire(wait=True) if exclusive else None
+        try:
+            if self.warm_up_connections:
+                warm_up(self.raw_session)
+            self.profiler.run(job, func)
+        finally:
+            if lock is not None:
+                lock.close()
 
-        while True:
-            schedule.run_pending()
-            time.sleep(50)
+    def execute(self):
+        """
+        starts the scheduler, see jobscheduler/timetable.py for the
+        schedule.  create and purge share the friend graph so they never
+        overlap (with each other, or with one-shot runs of either, see
+        jobscheduler/locks.py), tweeting runs alongside either.
+        """
+        scheduler = EventScheduler()
+        scheduler.register(Job("create", self.__create, group="friendships",
+                               grace_seconds=3 * 60 * 60))
+        scheduler.register(Job("purge", self.__purge, group="friendships",
+                               grace_seconds=12 * 60 * 60))
+        scheduler.register(Job("prefetch", self.__prefetch))
+        scheduler.register(Job("tweet", self.__tweet,
+                               grace_seconds=6 * 60 * 60))
+
+        # pick up edits to tweets.json as soon as they're saved
+        self.tweetservice.watch()
+        # cached/metrics.prom, and /metrics if metrics_port is set
+        metrics.start_exporter()
+        # kill -USR1 <pid> switches job profiling on/off
+        self.profiler.install()
+
+        scheduler.execute()
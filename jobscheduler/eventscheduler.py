@@ -0,0 +1,136 @@
+"""
+Event driven job scheduler: sleeps until the next slot in the timetable
+is due, and runs jobs on a worker pool so a long job never holds up
+another one's slot.
+"""
+import datetime
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from static import metrics
+from static.logger import logging
+from jobscheduler.timetable import WEEKLY, slots, next_occurrence
+
+MAX_WORKERS = 4
+# never sleep longer than this in one go, so clock changes are noticed
+MAX_SLEEP_SECONDS = 15 * 60
+DEFAULT_GRACE_SECONDS = 60 * 60
+
+
+class Job:  # pylint: disable=too-few-public-methods
+    """
+    a runnable job.  Jobs in the same group share `limit` running slots;
+    a run that can't start waits (coalesced with any later missed runs)
+    for up to `grace_seconds` after its slot before being skipped
+    """
+
+    def __init__(self, name, func, group=None, limit=1,
+                 grace_seconds=DEFAULT_GRACE_SECONDS):
+        self.name = name
+        self.func = func
+        self.group = group if group is not None else name
+        self.limit = limit
+        self.grace_seconds = grace_seconds
+
+
+class EventScheduler:
+    """
+    runs registered jobs at the slots of a timetable
+    """
+
+    def __init__(self, timetable=WEEKLY, max_workers=MAX_WORKERS,
+                 now=datetime.datetime.now):
+        self.timetable = timetable
+        self.now = now
+        self.jobs = {}
+        self.running = {}
+        # job name: slot it has been waiting to run since
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job")
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.heap = []
+
+    def register(self, job: Job):
+        """
+        make a job available to the timetable
+        """
+        self.jobs[job.name] = job
+        self.running.setdefault(job.group, 0)
+
+    def execute(self):
+        """
+        run the timetable until stop() is called
+        """
+        now = self.now()
+        for job, weekday, hour, minute in slots(self.timetable):
+            due = next_occurrence(weekday, hour, minute, now)
+            heapq.heappush(self.heap, (due, job, weekday, hour, minute))
+
+        with self.condition:
+            while not self.stopped:
+                now = self.now()
+                self.__queue_due(now)
+                self.__start_pending(now)
+                timeout = (self.heap[0][0] - now).total_seconds()
+                self.condition.wait(
+                    min(max(timeout, 0), MAX_SLEEP_SECONDS))
+        self.executor.shutdown(wait=True)
+
+    def stop(self):
+        """
+        stop dispatching (running jobs are allowed to finish)
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def __queue_due(self, now):
+        while self.heap and self.heap[0][0] <= now:
+            due, name, weekday, hour, minute = heapq.heappop(self.heap)
+            heapq.heappush(self.heap, (
+                next_occurrence(weekday, hour, minute, now),
+                name, weekday, hour, minute))
+            if name not in self.jobs:
+                logging.error('no job registered for %s', name)
+                continue
+            if name in self.pending:
+                logging.warning('%s at %s coalesced with the run '
+                                'waiting since %s', name, due,
+                                self.pending[name])
+                continue
+            self.pending[name] = due
+
+    def __start_pending(self, now):
+        for name, due in list(self.pending.items()):
+            job = self.jobs[name]
+            if (now - due).total_seconds() > job.grace_seconds:
+                logging.warning('%s missed its %s slot, skipping', name, due)
+                metrics.inc("job_runs_total", job=name, outcome="missed")
+                del self.pending[name]
+                continue
+            if self.running[job.group] >= job.limit:
+                continue
+            del self.pending[name]
+            self.running[job.group] = self.running[job.group] + 1
+            logging.info('starting %s (slot %s)', name, due)
+            self.executor.submit(self.__run, job)
+
+    def __run(self, job):
+        started = self.now()
+        outcome = "failed"
+        try:
+            job.func()
+            outcome = "ok"
+        except Exception:  # pylint: disable=broad-except
+            logging.exception('%s failed', job.name)
+        finally:
+            with self.condition:
+                self.running[job.group] = self.running[job.group] - 1
+                self.condition.notify_all()
+            elapsed = self.now() - started
+            metrics.inc("job_runs_total", job=job.name, outcome=outcome)
+            metrics.observe("job_duration_seconds", elapsed.total_seconds(),
+                            buckets=metrics.DURATION_BUCKETS, job=job.name)
+            logging.info('%s finished in %s', job.name, elapsed)
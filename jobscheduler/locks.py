@@ -0,0 +1,29 @@
+"""
+The lock that keeps create and purge (they share the friend graph) from
+overlapping across processes: the scheduler's jobs and one-shot runs
+from cron / systemd timers.
+"""
+import fcntl
+import os
+from static.logger import logging
+
+FRIENDSHIPS_LOCK = "cached/friendships.lock"
+
+
+def acquire(path=FRIENDSHIPS_LOCK, wait=False):
+    """
+    take the lock (an flock, so it goes away with the process), returns
+    the open lock file to close once done, or None if another process
+    holds it and wait is False
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock = open(path, 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        if not wait:
+            lock.close()
+            return None
+        logging.warning('waiting for another create/purge to finish')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
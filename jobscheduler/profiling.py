@@ -0,0 +1,174 @@
+"""
+On-demand profiling of job runs.  Switched on for some or all jobs with
+`profile_jobs` in the .env (`purge,create` or `all`), and toggled without
+a restart by sending the process SIGUSR1.  A profiled run writes, under
+cached/profiles/:
+
+    <job>-<started>.prof  cProfile stats (pstats, snakeviz, ...)
+    <job>-<started>.txt   where the time went (network, sleeps and lock
+                          waits, json, logging, cpu), peak memory, top
+                          functions and top allocation sites
+
+network is the time spent in MeteredSession.request, so it includes the
+client side of each request (signing, urllib3) and not only the round
+trip.  Profiling slows python code down severalfold, compare the shares
+rather than the absolute times with an unprofiled run.  Only the job's
+own thread is profiled: purge pages friends and followers on two worker
+threads (see FriendshipService.purge), that part shows up as a wait.
+"""
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+from static.logger import logging
+
+PROFILES = "cached/profiles"
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 10
+# (file name ending, function name): category.  Cumulative times, so
+# each entry point should be the outermost call of its category
+CATEGORIES = {
+    ("network/instrumented.py", "request"): "network",
+    ("~", "<built-in method time.sleep>"): "sleep",
+    ("~", "<method 'acquire' of '_thread.lock' objects>"): "sleep",
+    ("json/__init__.py", "loads"): "json",
+    ("json/__init__.py", "dumps"): "json",
+    ("json/__init__.py", "load"): "json",
+    ("json/__init__.py", "dump"): "json",
+    ("logging/__init__.py", "_log"): "logging",
+}
+
+
+def wanted(setting):
+    """
+    the jobs a `profile_jobs` value names (None for all of them)
+    """
+    names = {name.strip() for name in (setting or "").split(",")}
+    names.discard("")
+    if "all" in names:
+        return None
+    return names
+
+
+def breakdown(stats):
+    """
+    seconds per category (see CATEGORIES) from pstats.Stats
+    """
+    seconds = dict.fromkeys(sorted(set(CATEGORIES.values())), 0.0)
+    for (filename, _, function), row in stats.stats.items():
+        for (ending, name), category in CATEGORIES.items():
+            if function == name and filename.endswith(ending):
+                # tottime for builtins (they have no callees), cumulative
+                # for python entry points
+                seconds[category] += row[2] if ending == "~" else row[3]
+    return seconds
+
+
+class JobProfiler:
+    """
+    runs jobs under cProfile and tracemalloc when profiling is on for
+    them.  One job is profiled at a time (tracemalloc is process wide),
+    a job starting while another is profiled runs normally.
+    """
+
+    def __init__(self, setting=None, directory=PROFILES):
+        """
+        setting: `profile_jobs`, read from the .env when not given
+        """
+        if setting is None:
+            setting = os.getenv("profile_jobs", "")
+        self.jobs = wanted(setting) if setting else set()
+        self.directory = directory
+        self.lock = threading.Lock()
+
+    def enabled(self, job):
+        """
+        whether the job's next run gets profiled
+        """
+        return self.jobs is None or job in self.jobs
+
+    def toggle(self, *_args):
+        """
+        profile every job, or none (the SIGUSR1 handler)
+        """
+        self.jobs = set() if self.jobs is None or self.jobs else None
+        logging.warning('job profiling %s',
+                        'on for every job' if self.jobs is None else 'off')
+
+    def install(self):
+        """
+        toggle on SIGUSR1 (from the main thread only)
+        """
+        signal.signal(signal.SIGUSR1, self.toggle)
+
+    def run(self, job, func):
+        """
+        run func, profiled if it's switched on for the job
+        """
+        if not self.enabled(job):
+            return func()
+        if not self.lock.acquire(blocking=False):
+            logging.warning('not profiling %s, another job is being '
+                            'profiled', job)
+            return func()
+        try:
+            return self.__profile(job, func)
+        finally:
+            self.lock.release()
+
+    def __profile(self, job, func):
+        started_at = datetime.datetime.now()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, "reset_peak"):
+            # python 3.9+, before that the peak may predate the job
+            tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        profile.enable()
+        try:
+            return func()
+        finally:
+            profile.disable()
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            _, peak = tracemalloc.get_traced_memory()
+            allocations = tracemalloc.take_snapshot().statistics("lineno")
+            if not tracing:
+                tracemalloc.stop()
+            try:
+                self.__write(job, started_at, profile, (wall, cpu, peak),
+                             allocations)
+            except OSError:
+                logging.exception('could not write the %s profile', job)
+
+    def __write(self, job, started_at, profile, totals, allocations):
+        wall, cpu, peak = totals
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory,
+                            f'{job}-{started_at:%Y%m%d-%H%M%S}')
+        profile.dump_stats(f'{base}.prof')
+
+        functions = io.StringIO()
+        stats = pstats.Stats(profile, stream=functions)
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        lines = [f'{job} started {started_at:%Y-%m-%d %H:%M:%S}',
+                 f'{"wall":>10}: {wall:10.3f} s',
+                 f'{"cpu":>10}: {cpu:10.3f} s (this thread)']
+        for category, seconds in breakdown(stats).items():
+            lines.append(f'{category:>10}: {seconds:10.3f} s')
+        lines.append(f'{"peak":>10}: {peak / 2 ** 20:10.1f} MiB traced')
+        lines.append("")
+        lines.append(f'top {TOP_ALLOCATIONS} allocation sites (still held):')
+        lines.extend(str(line) for line in allocations[:TOP_ALLOCATIONS])
+        lines.append("")
+        lines.append(functions.getvalue())
+        with open(f'{base}.txt', 'w') as f_summary:
+            f_summary.write("\n".join(lines))
+        logging.info('%s profiled: %.1fs wall, %.1fs cpu, %.1f MiB peak, '
+                     'see %s.txt', job, wall, cpu, peak / 2 ** 20, base)
@@ -0,0 +1,57 @@
+"""
+The weekly timetable, as data.
+
+c = create
+p = purge
+t = tweet
+
+SCHEDULE
+S M T W Th F S
+c p c   c    c
+c   c   c    c
+c p c p c  p c
+t t t t t  t t
+
+(media for the next tweets is uploaded an hour before posting)
+"""
+import datetime
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday",
+        "saturday", "sunday")
+
+# (job, days, times)
+WEEKLY = (
+    # make friendships (100 friends, 3 times a day)
+    ("create", ("sunday", "tuesday", "thursday", "saturday"),
+     ("09:00", "15:00", "21:00")),
+    # purge friends (600 removals max)
+    ("purge", ("monday",), ("02:00", "18:30")),
+    ("purge", ("wednesday", "friday"), ("22:00",)),
+    # post a tweet once a day (every day at 1PM)
+    ("prefetch", DAYS, ("12:00",)),
+    ("tweet", DAYS, ("13:00",)),
+)
+
+
+def slots(timetable=WEEKLY):
+    """
+    flatten the timetable into (job, weekday number, hour, minute)
+    """
+    for job, days, times in timetable:
+        for day in days:
+            for at_time in times:
+                hour, minute = map(int, at_time.split(":"))
+                yield (job, DAYS.index(day), hour, minute)
+
+
+def next_occurrence(weekday, hour, minute, after):
+    """
+    the first datetime strictly after `after` on that weekday and time
+    """
+    candidate = after.replace(hour=hour, minute=minute,
+                              second=0, microsecond=0)
+    candidate = candidate + datetime.timedelta(
+        days=(weekday - after.weekday()) % 7)
+    if candidate <= after:
+        candidate = candidate + datetime.timedelta(days=7)
+    return candidate
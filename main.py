@@ -1,27 +1,44 @@
 """
 The main module serves as the entry point for the whole twitter user
 
-also contains a helper function to manually fetch the auth tokens (and update
-in the .env)
+    python main.py [run]    the scheduler, runs every job at its slot
+    python main.py create   one job, then exit (for cron / systemd timers)
+    python main.py purge
+    python main.py tweet
+    python main.py prefetch
+    python main.py auth     fetch the user context auth tokens (for the .env)
+    python main.py dry-run  check the .env and the drafts, show the schedule
+    python main.py drafts [list|remove ID|move ID POSITION]
+                            the queued tweets, in the order they're posted
+
+Each command imports only what it needs, so one-shot jobs and --help
+start quickly.
 """
-import os
-from pprint import pprint
-from requests_oauthlib import OAuth1Session
-import static.env
-from static.constants import REQUEST_TOKEN_URL
-from static.constants import AUTHENTICATE_URL
-from static.constants import ACCESS_TOKEN_URL
-from jobscheduler.actionscheduler import ActionScheduler
+import argparse
+import sys
+
+ONE_SHOT_JOBS = ("create", "purge", "tweet", "prefetch")
+OAUTH_SETTINGS = ("oauth_consumer_key", "oauth_consumer_secret",
+                  "oauth_token", "oauth_token_secret",
+                  "auth_user_screen_name")
 
 
-def user_context_auth():
+def user_context_auth(_args=None):
     """
-    Manually call this function to begin the auth process to refetch the resource
-    owner tokens.
+    Begins the auth process to refetch the resource owner tokens
+    (`python main.py auth`).
 
     Source:
     https://developer.twitter.com/en/docs/basics/authentication/overview/pin-based-oauth
     """
+    # pylint: disable=import-outside-toplevel
+    import os
+    from pprint import pprint
+    from requests_oauthlib import OAuth1Session
+    from static.constants import REQUEST_TOKEN_URL
+    from static.constants import AUTHENTICATE_URL
+    from static.constants import ACCESS_TOKEN_URL
+
     session = OAuth1Session(
         os.getenv("oauth_consumer_key"),
         client_secret=os.getenv("oauth_consumer_secret"),
@@ -33,24 +50,205 @@ def user_context_auth():
     oauth_verifier = input("Visit the above URL, and paste the PIN here: ")
     raw = session.fetch_access_token(ACCESS_TOKEN_URL, verifier=oauth_verifier)
     pprint(raw)
+    return 0
 
 
-def main():
+def run(_args=None):
     """
-    The entry point of the program
+    the long running scheduler
     - will initialize the process-wide session
+    (see network/sessionfactory.py for its pools and signing)
     """
-    twitter = OAuth1Session(
-        os.getenv("oauth_consumer_key"),
-        client_secret=os.getenv("oauth_consumer_secret"),
-        resource_owner_key=os.getenv("oauth_token"),
-        resource_owner_secret=os.getenv("oauth_token_secret"))
+    # pylint: disable=import-outside-toplevel
+    from jobscheduler.actionscheduler import ActionScheduler
+    from network.sessionfactory import session_from_env
+
+    twitter = session_from_env()
 
     scheduler = ActionScheduler(twitter)
     scheduler.execute()
+    return 0
+
+
+def run_once(args):
+    """
+    run a single job and exit, 1 if it failed or couldn't start
+    """
+    # pylint: disable=import-outside-toplevel
+    import time
+    from jobscheduler import locks
+    from jobscheduler.profiling import JobProfiler
+    from network.sessionfactory import job_session, session_from_env
+    from static import metrics
+    from static.logger import logging
+
+    job = args.command
+    lock = None
+    if job in ("create", "purge"):
+        # create and purge share the friend graph
+        lock = locks.acquire()
+        if lock is None:
+            print(f'another create/purge is running, not starting {job}',
+                  file=sys.stderr)
+            return 1
+
+    session = job_session(session_from_env())
+    profiler = JobProfiler()
+    started = time.monotonic()
+    outcome = "failed"
+    try:
+        if job == "create":
+            from users.friendshipservice import FriendshipService
+            profiler.run(job, FriendshipService(session).create)
+        elif job == "purge":
+            from users.friendshipservice import FriendshipService
+            profiler.run(job, FriendshipService(session).purge)
+        else:
+            from tweet.tweetservice import TweetService
+            service = TweetService(session)
+            try:
+                profiler.run(job, getattr(service, job))
+            finally:
+                service.media_cache.close()
+                service.queue.close()
+        outcome = "ok"
+    except Exception:  # pylint: disable=broad-except
+        logging.exception('%s failed', job)
+    finally:
+        metrics.inc("job_runs_total", job=job, outcome=outcome)
+        metrics.observe("job_duration_seconds", time.monotonic() - started,
+                        buckets=metrics.DURATION_BUCKETS, job=job)
+        metrics.write_snapshot()
+        if lock is not None:
+            lock.close()
+    return 0 if outcome == "ok" else 1
+
+
+def dry_run(_args=None):
+    """
+    check the .env and the drafts (queued, and waiting in tweets.json),
+    and print when each job runs next, without talking to twitter.
+    1 if something needs fixing
+    """
+    # pylint: disable=import-outside-toplevel
+    import datetime
+    import json
+    import os
+    import static.env  # pylint: disable=unused-import
+    from jobscheduler.timetable import WEEKLY, slots, next_occurrence
+    from tweet.tweetqueue import TWEET_DB, TweetQueue
+    from tweet.tweetservice import TWEETS, validate_drafts
+
+    problems = [f'{name} is not set in the .env'
+                for name in OAUTH_SETTINGS if not os.getenv(name)]
+    queued = []
+    if os.path.exists(TWEET_DB):
+        queue = TweetQueue()
+        try:
+            queued = queue.peek(limit=None)
+        finally:
+            queue.close()
+        # numbered by their place in line, as in `drafts list`
+        problems.extend(f'{TWEET_DB}: {error}'
+                        for error in validate_drafts(queued, first=1))
+    print(f'{TWEET_DB}: {len(queued)} drafts queued')
+    if queued:
+        print(f'next tweet: {queued[0]["img"]}: {queued[0]["text"]}')
+    if os.path.exists(TWEETS):
+        try:
+            with open(TWEETS, 'r') as f_tweets:
+                tweets = json.load(f_tweets)
+            problems.extend(f'{TWEETS}: {error}'
+                            for error in validate_drafts(tweets))
+            if tweets:
+                print(f'{TWEETS}: {len(tweets)} drafts waiting to be queued')
+        except ValueError as err:
+            problems.append(f'{TWEETS} is not valid json: {err}')
+
+    now = datetime.datetime.now()
+    upcoming = {}
+    for job, weekday, hour, minute in slots(WEEKLY):
+        due = next_occurrence(weekday, hour, minute, now)
+        upcoming[job] = min(due, upcoming.get(job, due))
+    for job, due in sorted(upcoming.items(), key=lambda item: item[1]):
+        print(f'{job:>8} next runs at {due:%a %Y-%m-%d %H:%M}')
+
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+def drafts(args):
+    """
+    list, remove or reorder the queued drafts (tweets.json is emptied into
+    the queue, see tweet/tweetqueue.py).  1 if there's no such draft
+    """
+    # pylint: disable=import-outside-toplevel
+    from tweet.tweetqueue import TweetQueue
+
+    queue = TweetQueue()
+    try:
+        if args.action == "remove":
+            done = queue.remove(args.id)
+        elif args.action == "move":
+            done = queue.move(args.id, args.position)
+        else:
+            done = True
+        if not done:
+            print(f'no queued draft with id {args.id}', file=sys.stderr)
+            return 1
+        for position, tweet in enumerate(queue.peek(limit=None), 1):
+            print(f'{position:>4}  id {tweet["id"]:<6} {tweet["img"]}: '
+                  f'{tweet["text"]}')
+    finally:
+        queue.close()
+    return 0
+
+
+def parse_args(argv=None):
+    """
+    command line options (no command means run)
+    """
+    parser = argparse.ArgumentParser(
+        description="twitter bot: scheduler and one-shot jobs")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("run", help="run the scheduler (the default)")
+    for job in ONE_SHOT_JOBS:
+        commands.add_parser(job, help=f'run {job} once and exit')
+    commands.add_parser("auth", help="fetch the user context auth tokens")
+    commands.add_parser("dry-run", help="check the configuration and "
+                                        "show the schedule")
+    queued = commands.add_parser("drafts", help="list, remove or reorder "
+                                                "the queued tweets")
+    actions = queued.add_subparsers(dest="action")
+    actions.add_parser("list", help="the queue, next to be posted first "
+                                    "(the default)")
+    remove = actions.add_parser("remove", help="drop a draft")
+    remove.add_argument("id", type=int, help="the draft's id (see list)")
+    move = actions.add_parser("move", help="move a draft in the queue")
+    move.add_argument("id", type=int, help="the draft's id (see list)")
+    move.add_argument("position", type=int,
+                      help="its new place in line (1 is posted next)")
+    return parser.parse_args(argv)
+
+
+COMMANDS = {
+    None: run,
+    "run": run,
+    "auth": user_context_auth,
+    "dry-run": dry_run,
+    "drafts": drafts,
+}
+COMMANDS.update({job: run_once for job in ONE_SHOT_JOBS})
+
+
+def main(argv=None):
+    """
+    The entry point of the program
+    """
+    args = parse_args(argv)
+    return COMMANDS[args.command](args)
 
 
 if __name__ == "__main__":
-    # f = FriendshipService(TWITTER)
-    # f.create()
-    main()
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Synthetic v1.1 shaped users, tweets and trends for the stand-in server
+and the benchmarks
+"""
+
+
+def synthetic_user(user_id):
+    """
+    a user object with the usual profile fields
+    """
+    return {
+        "id": user_id,
+        "id_str": str(user_id),
+        "name": f'User {user_id}',
+        "screen_name": f'user{user_id}',
+        "location": "Ottawa, Ontario",
+        "description": "coffee, code and the occasional hot take " * 3,
+        "url": "https://t.co/abcdefghij",
+        "entities": {"url": {"urls": [{
+            "url": "https://t.co/abcdefghij",
+            "expanded_url": "https://example.com",
+            "display_url": "example.com",
+            "indices": [0, 23]}]}, "description": {"urls": []}},
+        "followers_count": 1234,
+        "friends_count": 567,
+        "statuses_count": 8910,
+        "created_at": "Mon Jan 01 00:00:00 +0000 2018",
+        "profile_image_url_https":
+            "https://pbs.twimg.com/profile_images/1/abc_normal.jpg",
+        "profile_background_color": "C0DEED",
+        "verified": False,
+        "following": False,
+    }
+
+
+def synthetic_tweet(tweet_id, user_id, text=None):
+    """
+    a tweet object with entities and its author
+    """
+    return {
+        "id": tweet_id,
+        "id_str": str(tweet_id),
+        "created_at": "Mon Jan 01 00:00:00 +0000 2019",
+        "text": text or "Some trending thoughts #summer #fun https://t.co/x",
+        "truncated": False,
+        "entities": {
+            "hashtags": [{"text": "summer", "indices": [22, 29]},
+                         {"text": "fun", "indices": [30, 34]}],
+            "symbols": [], "user_mentions": [],
+            "urls": [{"url": "https://t.co/x", "indices": [35, 49],
+                      "expanded_url": "https://example.com/post"}]},
+        "metadata": {"iso_language_code": "en", "result_type": "recent"},
+        "source": "<a href=\"https://twitter.com\">Twitter Web App</a>",
+        "user": synthetic_user(user_id),
+        "retweet_count": 3,
+        "favorite_count": 7,
+        "lang": "en",
+    }
+
+
+def synthetic_trends(count=10):
+    """
+    a trends/place response
+    """
+    names = [f'#trend{index}' for index in range(count)]
+    return [{
+        "trends": [{
+            "name": name,
+            "url": f'http://twitter.com/search?q=%23{name[1:]}',
+            "query": f'%23{name[1:]}',
+            "tweet_volume": 10000 - index * 100
+        } for index, name in enumerate(names)],
+        "locations": [{"name": "Canada", "woeid": 23424775}]
+    }]
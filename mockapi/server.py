@@ -0,0 +1,579 @@
+"""
+A local stand-in for the twitter endpoints in static/constants.py, so the
+scheduler and services can be run and load tested offline.
+
+It serves a synthetic friend/follower graph of configurable size, keeps
+state for follows, likes, media uploads and tweets, and can inject
+latency, server errors and rate limiting (with real x-rate-limit-*
+headers).  Point the bot at it from the .env:
+
+    twitter_root_url=http://127.0.0.1:8080
+    twitter_upload_url=http://127.0.0.1:8080
+
+usage: python -m mockapi.server --friends 50000 --followers 40000
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from mockapi.payloads import synthetic_tweet, synthetic_user
+from mockapi.payloads import synthetic_trends
+from network.ratelimit import RATE_LIMITS
+
+VERSION_PREFIX = "/1.1"
+FIRST_USER_ID = 10**9
+FIRST_TWEET_ID = 10**18
+MEDIA_EXPIRY_SECONDS = 24 * 60 * 60
+
+# path: (requests, window seconds) of the documented read limits
+READ_LIMITS = {
+    urlparse(url).path: (limit, window)
+    for url, (limit, window, _) in RATE_LIMITS.items()
+    if window <= 15 * 60
+}
+
+
+class Graph:  # pylint: disable=too-many-instance-attributes
+    """
+    the account's synthetic state: friends, followers, likes, media, tweets
+    """
+
+    def __init__(self, friends, followers, follow_back, seed):
+        rand = random.Random(seed)
+        friend_ids = [FIRST_USER_ID + index for index in range(friends)]
+        following_back = rand.sample(
+            friend_ids, int(len(friend_ids) * follow_back))
+        others = [FIRST_USER_ID + friends + index
+                  for index in range(max(0, followers - len(following_back)))]
+        follower_ids = following_back + others
+        rand.shuffle(friend_ids)
+        rand.shuffle(follower_ids)
+        # newest first, like the api
+        self.friends = friend_ids
+        self.followers = follower_ids
+        self.friend_set = set(friend_ids)
+        self.follower_set = set(follower_ids)
+        self.favorites = []
+        self.media = {}
+        self.statuses = []
+        self.next_media_id = 1
+        self.lock = threading.Lock()
+        self.rand = rand
+
+    def newest_tweet_id(self):
+        """
+        tweet ids grow with time, so since_id behaves like the real thing
+        """
+        return FIRST_TWEET_ID + int(time.time() * 1000)
+
+
+class RateLimiter:
+    """
+    fixed window counters per (endpoint), like twitter's
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def check(self, path):
+        """
+        (allowed, headers) for a call to the endpoint
+        """
+        if path not in READ_LIMITS:
+            return (True, {})
+        limit, window = READ_LIMITS[path]
+        window = max(1, window / self.scale)
+        now = time.time()
+        with self.lock:
+            reset, used = self.windows.get(path, (0, 0))
+            if now >= reset:
+                reset, used = now + window, 0
+            allowed = used < limit
+            if allowed:
+                used = used + 1
+            self.windows[path] = (reset, used)
+        return (allowed, {
+            "x-rate-limit-limit": str(limit),
+            "x-rate-limit-remaining": str(limit - used),
+            "x-rate-limit-reset": str(int(reset) + 1),
+        })
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    routes the v1.1 paths to the Graph
+    """
+    server_version = "mockapi/1.1"
+    # keep-alive, like twitter (every response has a Content-Length)
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes, without this a kept
+    # alive connection waits on delayed acks (~40ms per response)
+    disable_nagle_algorithm = True
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """
+        connection warm-up (see network.sessionfactory.warm_up)
+        """
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        reads
+        """
+        self.__dispatch("GET")
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        writes (and the oauth/media endpoints)
+        """
+        self.__dispatch("POST")
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def __dispatch(self, method):
+        url = urlparse(self.path)
+        params = {key: values[-1]
+                  for key, values in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            params.update(multipart_fields(content_type, body))
+        elif body:
+            params.update({key: values[-1] for key, values
+                           in parse_qs(body.decode("utf-8")).items()})
+
+        config = self.server.config
+        if config.latency:
+            time.sleep(max(0, random.gauss(config.latency, config.jitter))
+                       / 1000)
+
+        allowed, headers = self.server.limiter.check(url.path)
+        if not allowed:
+            self.__send(429, {"errors": [{
+                "code": 88, "message": "Rate limit exceeded"}]}, headers)
+            return
+        if random.random() < config.error_rate:
+            self.__send(503, {"errors": [{
+                "code": 130, "message": "Over capacity"}]}, headers)
+            return
+
+        route = ROUTES.get((method, url.path))
+        if route is None and url.path.startswith(
+                (f'{VERSION_PREFIX}/retweet/', f'{VERSION_PREFIX}/unretweet/')):
+            route = retweet
+        if route is None:
+            self.__send(404, {"errors": [{
+                "code": 34, "message": "Sorry, that page does not exist."}]})
+            return
+        status, payload = route(self.server.graph, params, url.path)
+        self.__send(status, payload, headers)
+
+    def __send(self, status, payload, headers=None):
+        if isinstance(payload, (bytes, str)):
+            raw = payload if isinstance(payload, bytes) else \
+                payload.encode("utf-8")
+            content_type = "application/x-www-form-urlencoded"
+        else:
+            raw = json.dumps(payload).encode("utf-8")
+            content_type = "application/json;charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(raw)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+def multipart_fields(content_type, body):
+    """
+    the fields of a multipart/form-data body (file parts as bytes)
+    """
+    message = BytesParser().parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode("utf-8") + body)
+    fields = {}
+    for part in message.get_payload():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True)
+        fields[name] = payload if part.get_filename() else \
+            payload.decode("utf-8")
+    return fields
+
+
+def cursored(ids, params, page_size):
+    """
+    (page, next_cursor) with the cursor being an offset into the list
+    """
+    cursor = int(params.get("cursor", -1))
+    start = 0 if cursor < 0 else cursor
+    count = min(int(params.get("count", page_size)), page_size)
+    page = ids[start:start + count]
+    end = start + len(page)
+    return (page, end if end < len(ids) else 0)
+
+
+def oauth_token(_graph, _params, _path):
+    """
+    request_token/access_token
+    """
+    return (200, "oauth_token=mock&oauth_token_secret=mock"
+                 "&oauth_callback_confirmed=true&user_id=1&screen_name=mock")
+
+
+def trends(_graph, _params, _path):
+    """
+    trends/place
+    """
+    return (200, synthetic_trends())
+
+
+def users_search(graph, params, _path):
+    """
+    users/search
+    """
+    count = min(int(params.get("count", 20)), 20)
+    return (200, [synthetic_user(FIRST_USER_ID + graph.rand.randrange(10**6))
+                  for _ in range(count)])
+
+
+def tweet_search(graph, params, _path):
+    """
+    search/tweets, only tweets newer than since_id
+    """
+    newest = graph.newest_tweet_id()
+    since_id = int(params.get("since_id", 0))
+    count = min(int(params.get("count", 15)), 100)
+    tweet_ids = [tweet_id for tweet_id in range(newest, newest - count, -1)
+                 if tweet_id > since_id]
+    # authors come from outside the graph, with some repeats
+    statuses = [synthetic_tweet(
+        tweet_id, FIRST_USER_ID + 10**7 + graph.rand.randrange(10**5))
+        for tweet_id in tweet_ids]
+    return (200, {"statuses": statuses, "search_metadata": {
+        "max_id": newest, "since_id": since_id, "count": count}})
+
+
+def friend_ids(graph, params, _path):
+    """
+    friends/ids
+    """
+    with graph.lock:
+        page, next_cursor = cursored(graph.friends, params, 5000)
+    return (200, {"ids": page, "next_cursor": next_cursor,
+                  "previous_cursor": 0})
+
+
+def follower_ids(graph, params, _path):
+    """
+    followers/ids
+    """
+    with graph.lock:
+        page, next_cursor = cursored(graph.followers, params, 5000)
+    return (200, {"ids": page, "next_cursor": next_cursor,
+                  "previous_cursor": 0})
+
+
+def friends_list(graph, params, _path):
+    """
+    friends/list
+    """
+    with graph.lock:
+        page, next_cursor = cursored(graph.friends, params, 200)
+    return (200, {"users": list(map(synthetic_user, page)),
+                  "next_cursor": next_cursor, "previous_cursor": 0})
+
+
+def followers_list(graph, params, _path):
+    """
+    followers/list
+    """
+    with graph.lock:
+        page, next_cursor = cursored(graph.followers, params, 200)
+    return (200, {"users": list(map(synthetic_user, page)),
+                  "next_cursor": next_cursor, "previous_cursor": 0})
+
+
+def friendship_lookup(graph, params, _path):
+    """
+    friendships/lookup, up to 100 ids
+    """
+    user_ids = [int(user_id)
+                for user_id in params.get("user_id", "").split(",")
+                if user_id][:100]
+    relationships = []
+    with graph.lock:
+        for user_id in user_ids:
+            connections = []
+            if user_id in graph.friend_set:
+                connections.append("following")
+            if user_id in graph.follower_set:
+                connections.append("followed_by")
+            relationships.append({
+                "id": user_id, "id_str": str(user_id),
+                "screen_name": f'user{user_id}',
+                "connections": connections or ["none"]})
+    return (200, relationships)
+
+
+def friendship_create(graph, params, _path):
+    """
+    friendships/create
+    """
+    user_id = int(params["user_id"])
+    with graph.lock:
+        if user_id not in graph.friend_set:
+            graph.friend_set.add(user_id)
+            graph.friends.insert(0, user_id)
+    return (200, synthetic_user(user_id))
+
+
+def friendship_destroy(graph, params, _path):
+    """
+    friendships/destroy
+    """
+    user_id = int(params["user_id"])
+    with graph.lock:
+        if user_id in graph.friend_set:
+            graph.friend_set.discard(user_id)
+            graph.friends.remove(user_id)
+    return (200, synthetic_user(user_id))
+
+
+def favorite_create(graph, params, _path):
+    """
+    favorites/create
+    """
+    tweet_id = int(params["id"])
+    with graph.lock:
+        if tweet_id in graph.favorites:
+            return (403, {"errors": [{
+                "code": 139, "message": "You have already favorited this"}]})
+        graph.favorites.insert(0, tweet_id)
+    return (200, synthetic_tweet(tweet_id, FIRST_USER_ID))
+
+
+def favorite_destroy(graph, params, _path):
+    """
+    favorites/destroy
+    """
+    tweet_id = int(params["id"])
+    with graph.lock:
+        if tweet_id not in graph.favorites:
+            return (404, {"errors": [{
+                "code": 144, "message": "No status found with that ID."}]})
+        graph.favorites.remove(tweet_id)
+    return (200, synthetic_tweet(tweet_id, FIRST_USER_ID))
+
+
+def favorites_list(graph, params, _path):
+    """
+    favorites/list, newest first, honouring max_id
+    """
+    count = min(int(params.get("count", 20)), 200)
+    max_id = int(params["max_id"]) if "max_id" in params else None
+    with graph.lock:
+        tweet_ids = [tweet_id for tweet_id in graph.favorites
+                     if max_id is None or tweet_id <= max_id][:count]
+    return (200, [synthetic_tweet(tweet_id, FIRST_USER_ID + 10**7)
+                  for tweet_id in tweet_ids])
+
+
+def retweet(_graph, _params, path):
+    """
+    retweet/create/:id and unretweet/create/:id
+    """
+    tweet_id = int(os.path.basename(path).split(".")[0])
+    return (200, synthetic_tweet(tweet_id, FIRST_USER_ID))
+
+
+def status_update(graph, params, _path):
+    """
+    statuses/update, media must have been finalized and not expired
+    """
+    media_ids = [media_id for media_id
+                 in params.get("media_ids", "").split(",") if media_id]
+    with graph.lock:
+        for media_id in media_ids:
+            media = graph.media.get(media_id)
+            if media is None or not media["finalized"] or \
+                    media["expires_at"] < time.time():
+                return (400, {"errors": [{
+                    "code": 324, "message": "Invalid media id"}]})
+        tweet_id = graph.newest_tweet_id()
+        graph.statuses.append(
+            {"id": tweet_id, "text": params.get("status", ""),
+             "media_ids": media_ids})
+    return (200, synthetic_tweet(tweet_id, FIRST_USER_ID,
+                                 text=params.get("status")))
+
+
+def media_upload(graph, params, _path):
+    """
+    chunked media/upload: INIT, APPEND, FINALIZE and STATUS
+    """
+    command = params.get("command")
+    with graph.lock:
+        if command == "INIT":
+            media_id = str(graph.next_media_id)
+            graph.next_media_id = graph.next_media_id + 1
+            graph.media[media_id] = {
+                "total_bytes": int(params["total_bytes"]),
+                "received": 0,
+                "category": params.get("media_category", "tweet_image"),
+                "finalized": False,
+                "checks": 0,
+                "expires_at": 0,
+            }
+            return (202, {"media_id": int(media_id),
+                          "media_id_string": media_id,
+                          "expires_after_secs": MEDIA_EXPIRY_SECONDS})
+
+        media = graph.media.get(str(params.get("media_id")))
+        if media is None:
+            return (400, {"errors": [{
+                "code": 324, "message": "Invalid media id"}]})
+        media_id = str(params["media_id"])
+        if command == "APPEND":
+            media["received"] = media["received"] + len(params["media"])
+            return (204, b'')
+        if command == "FINALIZE":
+            if media["received"] != media["total_bytes"]:
+                return (400, {"errors": [{
+                    "code": 324, "message": "File size mismatch"}]})
+            media["finalized"] = True
+            media["expires_at"] = time.time() + MEDIA_EXPIRY_SECONDS
+            res = {"media_id": int(media_id), "media_id_string": media_id,
+                   "size": media["total_bytes"],
+                   "expires_after_secs": MEDIA_EXPIRY_SECONDS}
+            if media["category"] != "tweet_image":
+                res["processing_info"] = {
+                    "state": "pending", "check_after_secs": 1}
+            return (201, res)
+        if command == "STATUS":
+            media["checks"] = media["checks"] + 1
+            state = "succeeded" if media["checks"] > 1 else "in_progress"
+            return (200, {"media_id": int(media_id),
+                          "media_id_string": media_id,
+                          "expires_after_secs": MEDIA_EXPIRY_SECONDS,
+                          "processing_info": {
+                              "state": state, "check_after_secs": 1,
+                              "progress_percent": 100 if
+                              state == "succeeded" else 50}})
+    return (400, {"errors": [{"code": 38, "message": "command missing"}]})
+
+
+ROUTES = {
+    ("POST", "/oauth/request_token"): oauth_token,
+    ("POST", "/oauth/access_token"): oauth_token,
+    ("GET", f'{VERSION_PREFIX}/trends/place.json'): trends,
+    ("GET", f'{VERSION_PREFIX}/users/search.json'): users_search,
+    ("GET", f'{VERSION_PREFIX}/search/tweets.json'): tweet_search,
+    ("GET", f'{VERSION_PREFIX}/friends/ids.json'): friend_ids,
+    ("GET", f'{VERSION_PREFIX}/followers/ids.json'): follower_ids,
+    ("GET", f'{VERSION_PREFIX}/friends/list.json'): friends_list,
+    ("GET", f'{VERSION_PREFIX}/followers/list.json'): followers_list,
+    ("GET", f'{VERSION_PREFIX}/friendships/lookup.json'): friendship_lookup,
+    ("POST", f'{VERSION_PREFIX}/friendships/create.json'): friendship_create,
+    ("POST", f'{VERSION_PREFIX}/friendships/destroy.json'):
+        friendship_destroy,
+    ("POST", f'{VERSION_PREFIX}/favorites/create.json'): favorite_create,
+    ("POST", f'{VERSION_PREFIX}/favorites/destroy.json'): favorite_destroy,
+    ("GET", f'{VERSION_PREFIX}/favorites/list.json'): favorites_list,
+    ("POST", f'{VERSION_PREFIX}/statuses/update.json'): status_update,
+    ("POST", f'{VERSION_PREFIX}/media/upload.json'): media_upload,
+    ("GET", f'{VERSION_PREFIX}/media/upload.json'): media_upload,
+}
+
+
+def dump_fixtures(graph, directory="mock"):
+    """
+    write the json files the commented out mock/ hooks in the services read
+    """
+    os.makedirs(directory, exist_ok=True)
+    fixtures = {
+        "trends_ottawa.json": synthetic_trends(),
+        "friends1.json": {"users": list(map(synthetic_user,
+                                            graph.friends[:200]))},
+        "followers1.json": {"users": list(map(synthetic_user,
+                                              graph.followers[:200]))},
+        "tweets_hello_100.json": tweet_search(graph, {"count": 100}, "")[1],
+        "users_search_summer_fun.json": users_search(graph, {}, "")[1],
+    }
+    for name, payload in fixtures.items():
+        with open(os.path.join(directory, name), 'w') as f_fixture:
+            json.dump(payload, f_fixture, indent=4)
+
+
+def make_server(config):
+    """
+    a (not yet serving) stand-in server for the given options
+    """
+    server = ThreadingHTTPServer((config.host, config.port), Handler)
+    server.daemon_threads = True
+    server.config = config
+    server.verbose = config.verbose
+    server.graph = Graph(config.friends, config.followers,
+                         config.follow_back, config.seed)
+    server.limiter = RateLimiter(config.rate_limit_scale)
+    return server
+
+
+def parse_args(argv=None):
+    """
+    command line options
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--friends", type=int, default=1000)
+    parser.add_argument("--followers", type=int, default=800)
+    parser.add_argument("--follow-back", type=float, default=0.5,
+                        help="share of friends that follow back")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0,
+                        help="mean added latency in ms")
+    parser.add_argument("--jitter", type=float, default=0,
+                        help="latency standard deviation in ms")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="share of requests answered with a 503")
+    parser.add_argument("--rate-limit-scale", type=float, default=1,
+                        help="shrink the rate limit windows by this factor")
+    parser.add_argument("--dump-fixtures", metavar="DIR",
+                        help="write json fixtures (e.g. to mock/) and exit")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    serve until interrupted
+    """
+    config = parse_args(argv)
+    server = make_server(config)
+    if config.dump_fixtures:
+        dump_fixtures(server.graph, config.dump_fixtures)
+        server.server_close()
+        return
+    print(f'serving a {config.friends} friends / {config.followers} '
+          f'followers graph on http://{config.host}:{config.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
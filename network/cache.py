@@ -0,0 +1,236 @@
+"""
+TTL response cache for the read-only endpoints.
+
+Wraps the session handed to the services: GETs on endpoints with a ttl are
+served from a size bounded LRU (optionally backed by files under cached/),
+and writes drop the cached reads they make stale.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+from static.constants import TRENDS_URL, TWEET_SEARCH_URL, USER_SEARCH_URL
+from static.constants import FAVOURITED_TWEETS_URL
+from static.constants import TWEET_LIKE_URL, TWEET_UNLIKE_URL
+from static import metrics
+from static.logger import logging
+from network.ratelimit import endpoint_of
+
+HTTP_CACHE = "cached/http"
+MAX_ENTRIES = 256
+
+# endpoint: seconds a response stays fresh
+TTLS = {
+    # create() runs every 6 hours, trends barely move in between
+    TRENDS_URL: 8 * 60 * 60,
+    TWEET_SEARCH_URL: 5 * 60,
+    USER_SEARCH_URL: 15 * 60,
+    FAVOURITED_TWEETS_URL: 60,
+}
+
+# write endpoint: cached reads it makes stale (only endpoints with a ttl,
+# the friend/follower reads are never cached)
+INVALIDATES = {
+    TWEET_LIKE_URL: (FAVOURITED_TWEETS_URL,),
+    TWEET_UNLIKE_URL: (FAVOURITED_TWEETS_URL,),
+}
+
+
+def count(event, endpoint, amount=1):
+    """
+    http_cache_events_total{event,endpoint} (see static/metrics.py)
+    """
+    metrics.inc("http_cache_events_total", amount, event=event,
+                endpoint=urlparse(endpoint).path)
+
+
+class CachedResponse:
+    """
+    the parts of a requests.Response the services use
+    """
+
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+    @property
+    def text(self):
+        """
+        body as text
+        """
+        return self.content.decode("utf-8")
+
+    def json(self):
+        """
+        body parsed as json
+        """
+        return json.loads(self.content)
+
+
+class CachedSession:
+    """
+    caching wrapper with the get/post surface of requests.Session
+    """
+
+    def __init__(self, session, ttls=None, max_entries=MAX_ENTRIES,
+                 path=None, clock=time.time):
+        self.session = session
+        self.ttls = TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self.path = path
+        self.clock = clock
+        # url: (expires, endpoint, CachedResponse)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def request(self, method, url, **kwargs):
+        """
+        GETs go through the cache, anything else invalidates
+        """
+        if method.upper() == "GET":
+            return self.get(url, **kwargs)
+        response = self.session.request(method, url, **kwargs)
+        self.__invalidate_for(url)
+        return response
+
+    def get(self, url, **kwargs):
+        """
+        cached GET for endpoints with a ttl
+        """
+        endpoint = endpoint_of(url)
+        ttl = self.ttls.get(endpoint)
+        if ttl is None or kwargs:
+            return self.session.get(url, **kwargs)
+
+        cached = self.__lookup(url)
+        if cached is not None:
+            count("hit", endpoint)
+            return cached
+        count("miss", endpoint)
+
+        response = self.session.get(url)
+        if 200 <= response.status_code <= 299:
+            cached = CachedResponse(
+                response.status_code, response.content,
+                dict(response.headers))
+            self.__store(url, endpoint, self.clock() + ttl, cached)
+        return response
+
+    def post(self, url, **kwargs):
+        """
+        POST, then drop the cached reads the write made stale
+        """
+        response = self.session.post(url, **kwargs)
+        self.__invalidate_for(url)
+        return response
+
+    def invalidate(self, endpoint):
+        """
+        drop every cached response of an endpoint
+        """
+        with self.lock:
+            stale = [url for url, entry in self.entries.items()
+                     if entry[1] == endpoint]
+            for url in stale:
+                del self.entries[url]
+        if stale:
+            count("invalidation", endpoint, len(stale))
+        if self.path:
+            # entries only on disk (from an earlier process)
+            prefix = self.__endpoint_prefix(endpoint)
+            for file_name in os.listdir(self.path):
+                if file_name.startswith(prefix):
+                    self.__remove(os.path.join(self.path, file_name))
+
+    def __invalidate_for(self, url):
+        for endpoint in INVALIDATES.get(endpoint_of(url), ()):
+            # nothing of it can be cached (e.g. ttls passed in)
+            if endpoint in self.ttls:
+                self.invalidate(endpoint)
+
+    def __lookup(self, url):
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(url)
+                    return entry[2]
+                del self.entries[url]
+        if not self.path:
+            return None
+        entry = self.__read_file(url)
+        if entry is None or entry[0] <= now:
+            return None
+        with self.lock:
+            self.entries[url] = entry
+            self.__evict()
+        return entry[2]
+
+    def __store(self, url, endpoint, expires, cached):
+        with self.lock:
+            self.entries[url] = (expires, endpoint, cached)
+            self.entries.move_to_end(url)
+            self.__evict()
+        if self.path:
+            self.__write_file(url, endpoint, expires, cached)
+
+    def __evict(self):
+        while len(self.entries) > self.max_entries:
+            url, entry = self.entries.popitem(last=False)
+            self.__remove_file(url)
+            count("eviction", entry[1])
+
+    @staticmethod
+    def __endpoint_prefix(endpoint):
+        # files are grouped by endpoint so invalidation is a name match
+        return hashlib.sha1(endpoint.encode("utf-8")).hexdigest()[:8]
+
+    def __file_path(self, url):
+        prefix = self.__endpoint_prefix(endpoint_of(url))
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f'{prefix}-{digest}.json')
+
+    def __read_file(self, url):
+        try:
+            with open(self.__file_path(url), 'r') as f_entry:
+                raw = json.load(f_entry)
+        except (OSError, ValueError):
+            return None
+        cached = CachedResponse(
+            raw["status_code"], raw["body"].encode("utf-8"), raw["headers"])
+        return (raw["expires"], raw["endpoint"], cached)
+
+    def __write_file(self, url, endpoint, expires, cached):
+        raw = {
+            "url": url,
+            "endpoint": endpoint,
+            "expires": expires,
+            "status_code": cached.status_code,
+            "headers": cached.headers,
+            "body": cached.text
+        }
+        file_path = self.__file_path(url)
+        try:
+            with open(f'{file_path}.tmp', 'w') as f_entry:
+                json.dump(raw, f_entry)
+            os.replace(f'{file_path}.tmp', file_path)
+        except OSError as err:
+            logging.error('could not write cache entry for %s: %s', url, err)
+
+    def __remove_file(self, url):
+        if self.path:
+            self.__remove(self.__file_path(url))
+
+    @staticmethod
+    def __remove(file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
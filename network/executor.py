@@ -0,0 +1,174 @@
+"""
+Shared request executor: timeouts, retries with jittered exponential
+backoff, and a circuit breaker per host.
+
+GETs (and the POSTs that are safe to repeat, like follow or like) are
+retried on 5xx, 429 and connection errors.  Other POSTs are only retried
+when twitter can't have acted on them: a 429, or a connection that was
+never made.  A request that still fails comes back as a response with a
+5xx status, so callers only ever have to check the status code.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from static.constants import FRIENDSHIP_CREATE_URL, FRIENDSHIP_DESTROY_URL
+from static.constants import TWEET_LIKE_URL, TWEET_UNLIKE_URL
+from static.logger import logging
+from network.ratelimit import endpoint_of
+
+CONNECT_TIMEOUT_SECONDS = 5
+READ_TIMEOUT_SECONDS = 30
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1
+BACKOFF_CAP_SECONDS = 60
+# consecutive failures before a host's circuit opens, and for how long
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 60
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# repeating these leaves the account in the same state
+IDEMPOTENT_POSTS = (
+    FRIENDSHIP_CREATE_URL,
+    FRIENDSHIP_DESTROY_URL,
+    TWEET_LIKE_URL,
+    TWEET_UNLIKE_URL,
+)
+
+
+def failed_response(url, status_code, reason):
+    """
+    a stand-in response for a request that never got one
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = reason
+    response.url = url
+    response._content = reason.encode("utf-8")  # pylint: disable=protected-access
+    return response
+
+
+class CircuitBreaker:
+    """
+    stops calls to a host after repeated failures, letting a single trial
+    call through once the reset period is over
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD,
+                 reset_seconds=BREAKER_RESET_SECONDS, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        whether a call may go out now
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at >= self.reset_seconds:
+                # half open: one trial call, failing it re-opens
+                self.opened_at = self.clock()
+                return True
+            return False
+
+    def record(self, success):
+        """
+        count the outcome of a call
+        """
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures = self.failures + 1
+            if self.failures >= self.threshold:
+                self.opened_at = self.clock()
+
+
+class RetryingSession:
+    """
+    wraps a requests.Session (or another wrapper) with the retry policy
+    """
+
+    def __init__(self, session, max_retries=MAX_RETRIES,
+                 timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS),
+                 sleep=time.sleep):
+        self.session = session
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.sleep = sleep
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        """
+        send with timeouts, retrying what is safe to retry
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        breaker = self.__breaker(url)
+        retry_all = method.upper() == "GET" or \
+            endpoint_of(url) in IDEMPOTENT_POSTS
+        # a streamed body can't be replayed
+        replayable = not hasattr(kwargs.get("data"), "read")
+
+        attempt = 0
+        error = None
+        while True:
+            if not breaker.allow():
+                logging.error('circuit open for %s, not sending %s %s',
+                              urlparse(url).netloc, method, endpoint_of(url))
+                return failed_response(url, 503, "circuit open")
+
+            response = None
+            retry = False
+            try:
+                response = self.session.request(method, url, **kwargs)
+                retry = response.status_code in RETRY_STATUSES and \
+                    (retry_all or response.status_code == 429)
+                breaker.record(response.status_code < 500)
+            except requests.exceptions.ConnectTimeout as err:
+                breaker.record(False)
+                retry, error = True, err
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as err:
+                breaker.record(False)
+                retry, error = retry_all, err
+
+            if not retry or not replayable or attempt >= self.max_retries:
+                if response is not None:
+                    return response
+                logging.error('%s %s failed: %s',
+                              method, endpoint_of(url), error)
+                return failed_response(url, 599, str(error))
+
+            attempt = attempt + 1
+            delay = random.uniform(0, min(
+                BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+            logging.warning('%s %s retry %s in %.1fs', method,
+                            endpoint_of(url), attempt, delay)
+            self.sleep(delay)
+
+    def get(self, url, **kwargs):
+        """
+        GET with retries
+        """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """
+        POST with retries (when safe)
+        """
+        return self.request("POST", url, **kwargs)
+
+    def __breaker(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker()
+            return self.breakers[host]
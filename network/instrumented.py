@@ -0,0 +1,88 @@
+"""
+Session wrapper recording every request that actually goes out: latency
+per endpoint, request/error/429 counts, and the remaining quota from the
+x-rate-limit-* headers (see static/metrics.py for the exporter)
+"""
+import time
+from urllib.parse import urlparse
+from static import metrics
+
+
+def endpoint_label(url):
+    """
+    the url's path, so hosts and query strings don't multiply the series
+    """
+    return urlparse(url).path
+
+
+class MeteredSession:
+    """
+    the get/post/request surface of requests.Session, measured
+    """
+
+    def __init__(self, session, registry=metrics.REGISTRY,
+                 clock=time.perf_counter):
+        self.session = session
+        self.registry = registry
+        self.clock = clock
+
+    def request(self, method, url, **kwargs):
+        """
+        send the request and record how it went
+        """
+        endpoint = endpoint_label(url)
+        started = self.clock()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception:
+            self.registry.inc("twitter_request_errors_total",
+                              endpoint=endpoint, method=method,
+                              reason="connection")
+            raise
+        finally:
+            self.registry.observe("twitter_request_duration_seconds",
+                                  self.clock() - started,
+                                  endpoint=endpoint, method=method)
+
+        status = response.status_code
+        self.registry.inc("twitter_requests_total", endpoint=endpoint,
+                          method=method, status=status)
+        if status == 429:
+            self.registry.inc("twitter_rate_limited_total",
+                              endpoint=endpoint)
+        elif not 200 <= status <= 299:
+            self.registry.inc("twitter_request_errors_total",
+                              endpoint=endpoint, method=method,
+                              reason="status")
+        self.__record_quota(endpoint, response.headers)
+        return response
+
+    def get(self, url, **kwargs):
+        """
+        GET
+        """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """
+        POST
+        """
+        return self.request("POST", url, **kwargs)
+
+    def __record_quota(self, endpoint, headers):
+        remaining = headers.get("x-rate-limit-remaining")
+        if remaining is None:
+            return
+        try:
+            self.registry.set("twitter_rate_limit_remaining",
+                              int(remaining), endpoint=endpoint)
+            if "x-rate-limit-limit" in headers:
+                self.registry.set("twitter_rate_limit_limit",
+                                  int(headers["x-rate-limit-limit"]),
+                                  endpoint=endpoint)
+            if "x-rate-limit-reset" in headers:
+                self.registry.set("twitter_rate_limit_reset_timestamp",
+                                  int(headers["x-rate-limit-reset"]),
+                                  endpoint=endpoint)
+        except ValueError:
+            pass
@@ -0,0 +1,66 @@
+"""
+Projected json decoding for the large list responses.
+
+Every object is cut down to a whitelist of keys as soon as the parser has
+built it, so the bulk of a user/tweet (entities, profile, nested statuses)
+is garbage right away instead of living for the whole page, and tweets end
+up as small slotted records.
+"""
+import json
+
+
+class Tweet:  # pylint: disable=too-few-public-methods
+    """
+    the parts of a tweet the services use
+    """
+    __slots__ = ("id", "user_id")
+
+    def __init__(self, tweet_id, user_id):
+        self.id = tweet_id  # pylint: disable=invalid-name
+        self.user_id = user_id
+
+    def __repr__(self):
+        return f'Tweet({self.id}, user {self.user_id})'
+
+
+def project(content, keep):
+    """
+    json.loads that keeps only the whitelisted keys of every object
+    """
+    keep = tuple(keep)
+
+    def prune(obj):
+        return {key: obj[key] for key in keep if key in obj}
+    return json.loads(content, object_hook=prune)
+
+
+def decode_tweets(content):
+    """
+    a list of tweets (e.g. favorites/list) as Tweet records
+    """
+    tweets = project(content, ("id", "user"))
+    return [Tweet(tweet["id"], tweet["user"]["id"]) for tweet in tweets]
+
+
+def decode_search(content):
+    """
+    search/tweets statuses as Tweet records
+    """
+    res = project(content, ("statuses", "id", "user"))
+    return [Tweet(tweet["id"], tweet["user"]["id"])
+            for tweet in res["statuses"]]
+
+
+def decode_users_page(content):
+    """
+    (next_cursor, user ids) of a cursored users list (friends/followers)
+    """
+    res = project(content, ("next_cursor", "users", "id"))
+    return (res["next_cursor"], [user["id"] for user in res["users"]])
+
+
+def decode_relationships(content):
+    """
+    friendships/lookup results, only ids and connections
+    """
+    return project(content, ("id", "connections"))
@@ -0,0 +1,180 @@
+"""
+Builds the process wide signed session: a connection pool per twitter
+host sized for how it's used, OAuth1 signing with everything that doesn't
+change between requests computed once, and a warm-up that opens the
+connections before a job needs them.
+"""
+import binascii
+import functools
+import hashlib
+import hmac
+import os
+import random
+import time
+from urllib.parse import parse_qsl, quote, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from oauthlib.common import extract_params
+from network.cache import CachedSession, HTTP_CACHE
+from network.executor import RetryingSession
+from network.instrumented import MeteredSession
+from network.ratelimit import RateLimitedSession
+from static.constants import ROOT_URL, UPLOAD_URL
+from static.logger import logging
+
+# api.twitter.com: the scheduler's jobs and purge's two paging threads
+API_POOL_SIZE = 4
+# upload.twitter.com: one chunked upload at a time (plus a prefetch)
+UPLOAD_POOL_SIZE = 2
+WARM_UP_TIMEOUT_SECONDS = 5
+FORM_URLENCODED = "application/x-www-form-urlencoded"
+
+
+def escape(value):
+    """
+    RFC 5849 section 3.6 percent encoding
+    """
+    return quote(value, safe='~')
+
+
+@functools.lru_cache(maxsize=256)
+def escaped_base_uri(url):
+    """
+    the escaped base string uri (RFC 5849 section 3.4.1.2) of an endpoint
+    (no query string): lower case scheme and host, no default port
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname.lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80),
+                                                   ("https", 443)):
+        netloc = f'{netloc}:{parts.port}'
+    base = f'{scheme}://{netloc}{parts.path or "/"}'
+    return escape(base.replace(' ', '%20'))
+
+
+class PresignedOAuth1(AuthBase):
+    """
+    OAuth1 HMAC-SHA1 header signing, as requests_oauthlib.OAuth1 does it,
+    but with the consumer/token parameters escaped, the HMAC keyed and the
+    endpoints' base uris worked out once rather than on every request.
+    Only the nonce, timestamp and the request's own parameters are
+    encoded per request.
+    """
+
+    def __init__(self, consumer_key, consumer_secret, token, token_secret):
+        self.constant = [
+            ("oauth_version", "1.0"),
+            ("oauth_signature_method", "HMAC-SHA1"),
+            ("oauth_consumer_key", escape(consumer_key)),
+            ("oauth_token", escape(token)),
+        ]
+        self.header_params = ", ".join(
+            f'{name}="{value}"' for name, value in self.constant)
+        key = f'{escape(consumer_secret)}&{escape(token_secret)}'
+        self.keyed = hmac.new(key.encode("utf-8"), digestmod=hashlib.sha1)
+
+    @staticmethod
+    def nonce():
+        """
+        unique per request
+        """
+        return str(random.getrandbits(64)) + str(int(time.time()))
+
+    @staticmethod
+    def timestamp():
+        """
+        seconds since the epoch
+        """
+        return str(int(time.time()))
+
+    def signature(self, method, url, body_params, nonce, timestamp):
+        """
+        base64 HMAC-SHA1 of the signature base string
+        """
+        base, _, query = url.partition('?')
+        params = [(escape(name), escape(value)) for name, value in
+                  parse_qsl(query, keep_blank_values=True) + body_params]
+        params.extend(self.constant)
+        params.append(("oauth_nonce", nonce))
+        params.append(("oauth_timestamp", timestamp))
+        params.sort()
+        normalized = "&".join(f'{name}={value}' for name, value in params)
+        base_string = f'{method.upper()}&{escaped_base_uri(base)}&' \
+                      f'{escape(normalized)}'
+        digest = self.keyed.copy()
+        digest.update(base_string.encode("utf-8"))
+        return binascii.b2a_base64(digest.digest())[:-1].decode("utf-8")
+
+    def __call__(self, request):
+        body_params = []
+        content_type = request.headers.get("Content-Type", "")
+        if isinstance(content_type, bytes):
+            content_type = content_type.decode("utf-8")
+        if FORM_URLENCODED in content_type or \
+                (not content_type and extract_params(request.body)):
+            body = request.body or ""
+            if isinstance(body, bytes):
+                body = body.decode("utf-8")
+            body_params = parse_qsl(body, keep_blank_values=True)
+            request.headers["Content-Type"] = FORM_URLENCODED
+
+        nonce, timestamp = self.nonce(), self.timestamp()
+        signature = self.signature(
+            request.method, request.url, body_params, nonce, timestamp)
+        request.headers["Authorization"] = \
+            f'OAuth oauth_nonce="{nonce}", oauth_timestamp="{timestamp}", ' \
+            f'{self.header_params}, oauth_signature="{escape(signature)}"'
+        return request
+
+
+def make_session(consumer_key, consumer_secret, token, token_secret,
+                 root_url=ROOT_URL, upload_url=UPLOAD_URL):
+    """
+    the signed session, with separately sized pools per host
+    """
+    session = requests.Session()
+    session.auth = PresignedOAuth1(
+        consumer_key, consumer_secret, token, token_secret)
+    # requests picks the adapter with the longest matching prefix
+    session.mount(root_url, HTTPAdapter(
+        pool_connections=1, pool_maxsize=API_POOL_SIZE))
+    session.mount(upload_url, HTTPAdapter(
+        pool_connections=1, pool_maxsize=UPLOAD_POOL_SIZE))
+    return session
+
+
+def job_session(session):
+    """
+    the session the services use: one governor paces every job against
+    the shared rate limits (retries included), cache hits don't spend any
+    of it, and every request that goes out (retries too) is metered
+    """
+    return CachedSession(
+        RetryingSession(RateLimitedSession(MeteredSession(session))),
+        path=HTTP_CACHE)
+
+
+def session_from_env():
+    """
+    make_session with the oauth values from the .env
+    """
+    return make_session(
+        os.getenv("oauth_consumer_key"),
+        os.getenv("oauth_consumer_secret"),
+        os.getenv("oauth_token"),
+        os.getenv("oauth_token_secret"))
+
+
+def warm_up(session, urls=(ROOT_URL, UPLOAD_URL)):
+    """
+    open (DNS, TCP, TLS) a keep-alive connection to each host, so the
+    job's first real request doesn't pay for it.  Failures are only
+    logged, the job's own requests will retry.
+    """
+    for url in urls:
+        try:
+            session.head(url, timeout=WARM_UP_TIMEOUT_SECONDS)
+        except requests.RequestException as err:
+            logging.warning('could not warm up %s: %s', url, err)
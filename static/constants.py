@@ -2,8 +2,12 @@
 Constants to be used throughout this program
 stored here.
 """
-ROOT_URL = "https://api.twitter.com"
-UPLOAD_URL = "https://upload.twitter.com"
+import os
+import static.env  # pylint: disable=unused-import
+
+# overridable (e.g. in the .env) to point at a stand-in, see mockapi/
+ROOT_URL = os.getenv("twitter_root_url", "https://api.twitter.com")
+UPLOAD_URL = os.getenv("twitter_upload_url", "https://upload.twitter.com")
 
 REQUEST_TOKEN_URL = f'{ROOT_URL}/oauth/request_token'
 AUTHENTICATE_URL = f'{ROOT_URL}/oauth/authenticate'
@@ -16,6 +20,9 @@ FRIENDSHIP_CREATE_URL = f'{ROOT_URL}/{VERSION}/friendships/create.json'
 FRIENDSHIP_DESTROY_URL = f'{ROOT_URL}/{VERSION}/friendships/destroy.json'
 FRIENDS_URL = f'{ROOT_URL}/{VERSION}/friends/list.json'
 FOLLOWERS_URL = f'{ROOT_URL}/{VERSION}/followers/list.json'
+FRIEND_IDS_URL = f'{ROOT_URL}/{VERSION}/friends/ids.json'
+FOLLOWER_IDS_URL = f'{ROOT_URL}/{VERSION}/followers/ids.json'
+FRIENDSHIP_LOOKUP_URL = f'{ROOT_URL}/{VERSION}/friendships/lookup.json'
 
 TWEET_SEARCH_URL = f'{ROOT_URL}/{VERSION}/search/tweets.json'
 TWEET_LIKE_URL = f'{ROOT_URL}/{VERSION}/favorites/create.json'
@@ -1,22 +1,146 @@
 """
 Setup for the logging mechanism.
 Helper methods for logging mechanism go here too.
+
+Records are handed to a queue and written by a background thread, as
+json lines to output.log (rotated by size), so logging never waits on the
+disk.  Log with %-style arguments rather than f-strings: the message is
+only built by the writer thread, and not at all when the level is off.
+Arguments must not be changed after the call, since they're read later.
 """
+import atexit
+import datetime
+import json
 import logging
+import logging.handlers
+import queue
+import threading
+
+LOG_FILE = 'output.log'
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+RESPONSE_BODY_LIMIT = 500
+
+# attributes every LogRecord has, anything else came in through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord(
+    "", logging.INFO, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    one json object per line: time, level, module, function, message,
+    plus any fields passed with `extra`
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "module": record.module,
+            "func": record.funcName,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    queues the record as is, leaving the formatting to the writer thread
+    (the stock QueueHandler formats in the caller's thread)
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    for records logged with extra=sampled(n): lets 1 in n through per
+    message template (the record carries "sampled": n so counts can be
+    scaled back up)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.seen = {}
+        self.lock = threading.Lock()
 
-logging.basicConfig(
-    filename='output.log',
-    level=logging.INFO,
-    format='%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S')
+    def filter(self, record):
+        every = getattr(record, "sampled", None)
+        if not every or every <= 1:
+            return True
+        key = (record.name, record.msg)
+        with self.lock:
+            count = self.seen.get(key, 0)
+            self.seen[key] = count + 1
+        return count % every == 0
 
 
-def res_err(response, msg):
+def sampled(every):
+    """
+    `extra` for high volume, per item messages: only 1 in `every` is kept
+    """
+    return {"sampled": every}
+
+
+def setup(path=LOG_FILE, level=logging.INFO):
+    """
+    route the root logger through the queue to the rotating json writer,
+    returns the (started) listener
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT)
+    file_handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(records)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    log_listener = logging.handlers.QueueListener(records, file_handler)
+    log_listener.start()
+    # flush what's queued on exit
+    atexit.register(log_listener.stop)
+    return log_listener
+
+
+LISTENER = setup()
+
+
+def res_err(response, msg, *args, sample=None):
     """
     helper method to log response information from the requests library
     ONLY if the response code is not 2xx.
+    msg is %-formatted with args only when it is logged
     """
+    _log_response(response, msg, args, sample)
+
+
+def res_ok(response, msg, *args, sample=None):
+    """
+    helper method that logs a non 2xx response (see res_err),
+    and tells whether the response was a 2xx
+    """
+    _log_response(response, msg, args, sample)
+    return 200 <= response.status_code <= 299
+
+
+def _log_response(response, msg, args, sample):
     if response.status_code < 200 or response.status_code > 299:
-        logging.error('RESPONSE CODE: %s', response.status_code)
-        logging.error(msg)
-        logging.error(response.text)
+        extra = {
+            "status": response.status_code,
+            "body": response.text[:RESPONSE_BODY_LIMIT]
+        }
+        if sample:
+            extra.update(sampled(sample))
+        # attributed to the caller of res_err/res_ok
+        logging.error(msg, *args, extra=extra, stacklevel=3)
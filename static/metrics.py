@@ -0,0 +1,188 @@
+"""
+In-process metrics (counters, gauges and histograms with labels), shared
+like the logger.  They can be scraped in the prometheus text format from
+a local endpoint, and are written to cached/metrics.prom periodically.
+
+https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from static.logger import logging
+
+SNAPSHOT = "cached/metrics.prom"
+SNAPSHOT_SECONDS = 60
+# seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DURATION_BUCKETS = (1, 10, 60, 5 * 60, 15 * 60, 60 * 60, 4 * 60 * 60)
+
+
+class Registry:
+    """
+    metric name: {sorted label pairs: value}.  Histogram values are
+    [bucket counts..., count, sum]
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        """
+        add to a counter
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """
+        set a gauge
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """
+        record a value in a histogram
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            bounds = self.buckets.setdefault(name, buckets)
+            series = self.histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(bounds) + 2)
+            for index, bound in enumerate(bounds):
+                if value <= bound:
+                    counts[index] = counts[index] + 1
+            counts[-2] = counts[-2] + 1
+            counts[-1] = counts[-1] + value
+
+    def render(self):
+        """
+        everything in the prometheus text format
+        """
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{format_labels(key)} {value}')
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f'# TYPE {name} gauge')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{format_labels(key)} {value}')
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f'# TYPE {name} histogram')
+                bounds = self.buckets[name]
+                for key, counts in sorted(series.items()):
+                    for bound, count in zip(bounds, counts):
+                        le_key = key + (("le", str(bound)),)
+                        lines.append(
+                            f'{name}_bucket{format_labels(le_key)} {count}')
+                    inf_key = key + (("le", "+Inf"),)
+                    lines.append(
+                        f'{name}_bucket{format_labels(inf_key)} {counts[-2]}')
+                    lines.append(f'{name}_count{format_labels(key)} {counts[-2]}')
+                    lines.append(f'{name}_sum{format_labels(key)} {counts[-1]}')
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(key):
+    """
+    {a="1",b="2"} (or nothing without labels)
+    """
+    if not key:
+        return ""
+    pairs = ",".join(f'{name}="{escape(value)}"' for name, value in key)
+    return f'{{{pairs}}}'
+
+
+def escape(value):
+    """
+    a label value with backslashes, quotes and newlines escaped
+    """
+    return str(value).replace("\\", "\\\\").replace(
+        '"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set
+observe = REGISTRY.observe
+
+
+def write_snapshot(path=SNAPSHOT, registry=REGISTRY):
+    """
+    write the metrics to a file, atomically replacing the previous one
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f_metrics:
+        f_metrics.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """
+    serve the metrics on http://host:port/metrics from a daemon thread
+    """
+    class Handler(BaseHTTPRequestHandler):
+        """
+        GET /metrics
+        """
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """
+            the current metrics
+            """
+            if self.path.split('?', 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_args):  # pylint: disable=arguments-differ
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics",
+                     daemon=True).start()
+    logging.info('serving metrics on http://%s:%s/metrics', host, port)
+    return server
+
+
+def start_exporter(path=SNAPSHOT, interval=SNAPSHOT_SECONDS, registry=REGISTRY):
+    """
+    write the snapshot file every `interval` seconds, and serve the
+    metrics too if `metrics_port` is set in the .env
+    """
+    port = os.getenv("metrics_port")
+    if port:
+        serve(int(port), registry=registry)
+
+    def snapshot():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot(path, registry)
+            except OSError:
+                logging.exception('could not write %s', path)
+
+    snapshotter = threading.Thread(
+        target=snapshot, name="metrics-snapshot", daemon=True)
+    snapshotter.start()
+    return snapshotter
@@ -0,0 +1,61 @@
+"""
+PresignedOAuth1 signs exactly like requests_oauthlib.OAuth1
+"""
+import unittest
+from unittest import mock
+import requests
+from requests_oauthlib import OAuth1
+from network.sessionfactory import PresignedOAuth1
+
+CREDENTIALS = ("consumer key", "consumer/secret", "token+key", "token&secret")
+NONCE = "1234567890123456789"
+TIMESTAMP = "1700000000"
+
+
+def authorization(auth, method, url, **kwargs):
+    """
+    the Authorization header auth puts on the request (as str, OAuth1
+    sets bytes)
+    """
+    request = requests.Request(method, url, auth=auth, **kwargs).prepare()
+    header = request.headers["Authorization"]
+    return header.decode("utf-8") if isinstance(header, bytes) else header
+
+
+class PresignedOAuth1Test(unittest.TestCase):
+    """
+    the same header as OAuth1, given the same nonce and timestamp
+    """
+
+    def setUp(self):
+        self.reference = OAuth1(*CREDENTIALS, nonce=NONCE,
+                                timestamp=TIMESTAMP)
+        self.presigned = PresignedOAuth1(*CREDENTIALS)
+        for name, value in (("nonce", NONCE), ("timestamp", TIMESTAMP)):
+            patcher = mock.patch.object(
+                PresignedOAuth1, name, staticmethod(lambda value=value: value))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assert_same_header(self, method, url, **kwargs):
+        """
+        both sign the request with the same Authorization header
+        """
+        self.assertEqual(authorization(self.presigned, method, url, **kwargs),
+                         authorization(self.reference, method, url, **kwargs))
+
+    def test_get_with_query_string(self):
+        self.assert_same_header(
+            "GET", "https://api.twitter.com/1.1/followers/ids.json",
+            params={"screen_name": "some_user", "cursor": -1,
+                    "q": "100% café ~test"})
+
+    def test_form_post(self):
+        self.assert_same_header(
+            "POST", "https://api.twitter.com/1.1/statuses/update.json",
+            data={"status": "hello, world! #tag @user & more",
+                  "media_ids": "123,456"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Content addressed cache of pictures normalized for upload.
+
+Still images are downscaled and recompressed to fit twitter's limits, with
+their metadata stripped, and the result is stored under cached/media keyed
+by the hash of the original bytes, so the same picture is only processed
+once.  Encoding runs in a process pool, off the scheduler's threads.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from static.logger import logging
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pictures are uploaded as-is without Pillow
+    Image = ImageOps = None
+
+MEDIA_CACHE = "cached/media"
+# https://developer.twitter.com/en/docs/media/upload-media/uploading-media/media-best-practices
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+MAX_DIMENSION = 4096
+JPEG_QUALITIES = (85, 75, 65, 50)
+# bump when the processing below changes, so old results aren't reused
+PROCESSING_VERSION = 2
+STILL_FORMATS = ("JPEG", "PNG", "WEBP", "BMP", "TIFF")
+# marks a digest whose picture is uploaded as-is (gifs, videos...)
+PASSTHROUGH_SUFFIX = ".original"
+
+
+def file_digest(file_path):
+    """
+    sha256 of a file's contents (and the processing version)
+    """
+    digest = hashlib.sha256(f'v{PROCESSING_VERSION}:'.encode("utf-8"))
+    with open(file_path, 'rb') as media_file:
+        for block in iter(lambda: media_file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_image(src_path, dst_path):
+    """
+    write a metadata free copy of a still image that fits the limits,
+    returns the path to upload (the original if it isn't a still image).
+    Runs in a worker process.
+    """
+    with Image.open(src_path) as image:
+        if image.format not in STILL_FORMATS:
+            # remembered, so it isn't opened again on the next prefetch
+            with open(f'{dst_path}{PASSTHROUGH_SUFFIX}', 'w'):
+                pass
+            return src_path
+        # png keeps its transparency if it already fits, the rest is jpeg
+        keep_png = image.format == "PNG" and \
+            os.path.getsize(src_path) <= MAX_IMAGE_BYTES
+        # rotate as the exif orientation says, the tag is dropped below
+        upright = ImageOps.exif_transpose(image)
+        upright.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+        clean = upright.convert("RGBA" if keep_png else "RGB")
+        # drop exif/icc/text chunks, save() only writes what is left here
+        clean.info = {}
+
+    tmp_path = f'{dst_path}.tmp'
+    if keep_png:
+        clean.save(tmp_path, format="PNG", optimize=True)
+    else:
+        for quality in JPEG_QUALITIES:
+            clean.save(tmp_path, format="JPEG", quality=quality,
+                       optimize=True, progressive=True)
+            if os.path.getsize(tmp_path) <= MAX_IMAGE_BYTES:
+                break
+    os.replace(tmp_path, dst_path)
+    return dst_path
+
+
+class MediaCache:
+    """
+    maps pictures to their normalized copy under cached/media
+    """
+
+    def __init__(self, path=MEDIA_CACHE, max_workers=None):
+        """
+        max_workers: worker processes, one per cpu by default
+        """
+        self.path = path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = None
+        # digest: Future, for pictures being processed right now
+        self.running = {}
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def submit(self, file_path):
+        """
+        start normalizing a picture, returns a Future of the path to upload
+        (the same Future for copies of a picture already being processed)
+        """
+        done = Future()
+        if Image is None:
+            done.set_result(file_path)
+            return done
+
+        digest = file_digest(file_path)
+        # the uploader sniffs the real type, so no extension is needed
+        dst_path = os.path.join(self.path, digest)
+        with self.lock:
+            if os.path.exists(dst_path):
+                done.set_result(dst_path)
+                return done
+            if os.path.exists(f'{dst_path}{PASSTHROUGH_SUFFIX}'):
+                done.set_result(file_path)
+                return done
+            running = self.running.get(digest)
+            if running is not None:
+                return running
+
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers)
+            future = self.executor.submit(normalize_image, file_path, dst_path)
+            self.running[digest] = future
+        future.add_done_callback(lambda _: self.__finished(digest))
+        return future
+
+    def __finished(self, digest):
+        with self.lock:
+            self.running.pop(digest, None)
+
+    def prepare(self, file_path):
+        """
+        the path to upload for a picture, falling back to the original
+        if it can't be processed
+        """
+        try:
+            return self.submit(file_path).result()
+        except Exception as err:  # pylint: disable=broad-except
+            logging.error('could not normalize %s: %s', file_path, err)
+            return file_path
+
+    def close(self):
+        """
+        stop the worker processes
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,231 @@
+"""
+Chunked media upload (INIT/APPEND/FINALIZE) that streams a memory mapped
+file, so large GIFs and videos upload in bounded memory.
+
+Each APPEND body is a multipart stream around a memoryview slice of the
+mapping: nothing is read into a bytes object or copied by the encoder.
+
+https://developer.twitter.com/en/docs/media/upload-media/uploading-media/chunked-media-upload
+"""
+import mmap
+import os
+import time
+import uuid
+from static.constants import MEDIA_UPLOAD_URL
+from static.logger import logging
+from static.logger import res_ok
+
+MIN_SEGMENT_BYTES = 512 * 1024
+MAX_SEGMENT_BYTES = 4 * 1024 * 1024
+FIRST_SEGMENT_BYTES = 1024 * 1024
+# segment size is adapted so an APPEND takes about this long
+TARGET_SEGMENT_SECONDS = 2.0
+# used when FINALIZE doesn't say (twitter keeps media for a day)
+DEFAULT_MEDIA_EXPIRY_SECONDS = 24 * 60 * 60
+
+# (magic bytes, offset, media type, media category)
+SIGNATURES = (
+    (b'\xff\xd8\xff', 0, "image/jpeg", "tweet_image"),
+    (b'\x89PNG\r\n\x1a\n', 0, "image/png", "tweet_image"),
+    (b'GIF87a', 0, "image/gif", "tweet_gif"),
+    (b'GIF89a', 0, "image/gif", "tweet_gif"),
+    (b'WEBP', 8, "image/webp", "tweet_image"),
+    (b'ftyp', 4, "video/mp4", "tweet_video"),
+)
+
+
+def sniff_media_type(header):
+    """
+    (media type, media category) from the first bytes of a file,
+    falls back to jpeg (the old hard-coded type)
+    """
+    for magic, offset, media_type, category in SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return (media_type, category)
+    return ("image/jpeg", "tweet_image")
+
+
+class MultipartStream:
+    """
+    a multipart/form-data body readable as a file, whose file part is a
+    memoryview slice (so requests streams it with a Content-Length)
+    """
+
+    def __init__(self, fields, name, payload):
+        self.boundary = uuid.uuid4().hex
+        head = []
+        for key, value in fields.items():
+            head.append(
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+                f'{value}\r\n')
+        head.append(
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{name}"; '
+            f'filename="{name}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n')
+        tail = f'\r\n--{self.boundary}--\r\n'
+        self.parts = [
+            memoryview("".join(head).encode("utf-8")),
+            payload,
+            memoryview(tail.encode("utf-8"))]
+        self.length = sum(map(len, self.parts))
+        self.payload_bytes = len(payload)
+        self.part = 0
+        self.offset = 0
+
+    @property
+    def content_type(self):
+        """
+        the Content-Type header for this body
+        """
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        """
+        next slice of the body (a memoryview, never a copy)
+        """
+        while self.part < len(self.parts):
+            current = self.parts[self.part]
+            if self.offset < len(current):
+                end = len(current) if size < 0 else self.offset + size
+                piece = current[self.offset:end]
+                self.offset = self.offset + len(piece)
+                return piece
+            self.part = self.part + 1
+            self.offset = 0
+        return b''
+
+    def release(self):
+        """
+        release the memoryviews (the payload's buffer can then be closed)
+        """
+        for part in self.parts:
+            part.release()
+
+
+class MediaUploader:
+    """
+    uploads files with the chunked endpoint, adapting the segment size
+    to the measured throughput
+    """
+
+    def __init__(self, session, clock=time.monotonic, sleep=time.sleep):
+        self.session = session
+        self.clock = clock
+        self.sleep = sleep
+        self.segment_bytes = FIRST_SEGMENT_BYTES
+
+    def upload(self, file_path):
+        """
+        returns (media_id, expires_at) or None if any step failed
+        """
+        file_size = os.path.getsize(file_path)
+        if file_size == 0:
+            logging.error('%s is empty', file_path)
+            return None
+
+        with open(file_path, 'rb') as media_file, \
+                mmap.mmap(media_file.fileno(), 0,
+                          access=mmap.ACCESS_READ) as mapped:
+            media_type, category = sniff_media_type(mapped[:16])
+            media = memoryview(mapped)
+            try:
+                media_id = self.__init(file_path, file_size,
+                                       media_type, category)
+                if media_id is None:
+                    return None
+                if not self.__append_all(media_id, media, file_path):
+                    return None
+            finally:
+                media.release()
+
+        return self.__finalize(media_id, file_path)
+
+    def __init(self, file_path, file_size, media_type, category):
+        params = {
+            "command": "INIT",
+            "media_type": media_type,
+            "media_category": category,
+            "total_bytes": file_size
+        }
+        init_response = self.session.post(MEDIA_UPLOAD_URL, data=params)
+        if not res_ok(init_response, "MEDIA UPLOAD INIT"):
+            return None
+        logging.info('%s (%s) INIT succeeded', file_path, media_type)
+        return init_response.json()['media_id_string']
+
+    def __append_all(self, media_id, media, file_path):
+        segment_id = 0
+        bytes_sent = 0
+        file_size = len(media)
+        while bytes_sent < file_size:
+            segment = media[bytes_sent:bytes_sent + self.segment_bytes]
+            body = MultipartStream({
+                "command": "APPEND",
+                "media_id": media_id,
+                "segment_index": segment_id
+            }, "media", segment)
+            started = self.clock()
+            try:
+                chunk_res = self.session.post(
+                    MEDIA_UPLOAD_URL, data=body,
+                    headers={"Content-Type": body.content_type})
+            finally:
+                # the mapping can only be closed once no slice is alive
+                body.release()
+            elapsed = self.clock() - started
+            if not res_ok(chunk_res, 'MEDIA UPLOAD APPEND (%s/%s) %s',
+                          bytes_sent, file_size, file_path):
+                return False
+
+            self.__adapt(body.payload_bytes, elapsed)
+            segment_id = segment_id + 1
+            bytes_sent = bytes_sent + body.payload_bytes
+        logging.info('%s APPEND succeeded in %s segments',
+                     file_path, segment_id)
+        return True
+
+    def __adapt(self, sent, elapsed):
+        """
+        size the next segment to take about TARGET_SEGMENT_SECONDS
+        """
+        if elapsed <= 0:
+            return
+        throughput = sent / elapsed
+        wanted = int(throughput * TARGET_SEGMENT_SECONDS)
+        self.segment_bytes = max(
+            MIN_SEGMENT_BYTES, min(MAX_SEGMENT_BYTES, wanted))
+
+    def __finalize(self, media_id, file_path):
+        params = {
+            "command": "FINALIZE",
+            "media_id": media_id,
+        }
+        fin_res = self.session.post(MEDIA_UPLOAD_URL, data=params)
+        if not res_ok(fin_res, "MEDIA UPLOAD FINALIZE"):
+            return None
+        res = fin_res.json()
+
+        # gifs and videos are processed asynchronously
+        processing = res.get("processing_info")
+        while processing and processing.get("state") in ("pending",
+                                                         "in_progress"):
+            self.sleep(processing.get("check_after_secs", 1))
+            status_res = self.session.get(
+                f'{MEDIA_UPLOAD_URL}?command=STATUS&media_id={media_id}')
+            if not res_ok(status_res, "MEDIA UPLOAD STATUS"):
+                return None
+            res = status_res.json()
+            processing = res.get("processing_info")
+        if processing and processing.get("state") == "failed":
+            logging.error('%s processing failed: %s', file_path, processing)
+            return None
+
+        logging.info('%s %s FINALIZE succeeded', file_path, media_id)
+        expires_after = res.get(
+            "expires_after_secs", DEFAULT_MEDIA_EXPIRY_SECONDS)
+        return (media_id, time.time() + expires_after)
@@ -0,0 +1,256 @@
+"""
+SQLite backed queue of drafted tweets, replacing the full rewrite of
+tweets.json/tweeted.json on every post.
+
+tweets.json stays the place to draft tweets: its entries are imported at
+the back of the queue and the file is reset to an empty list.  Queued
+drafts are listed, reordered and removed with `python main.py drafts`.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+TWEET_DB = "cached/tweets/tweets.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    img TEXT NOT NULL,
+    text TEXT NOT NULL,
+    position INTEGER
+);
+CREATE TABLE IF NOT EXISTS tweeted (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    img TEXT NOT NULL,
+    text TEXT NOT NULL,
+    tweeted_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS media (
+    entry_id INTEGER PRIMARY KEY,
+    media_id TEXT NOT NULL,
+    expires_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+# after the migration (queues created before drafts could be reordered
+# have no position column)
+QUEUE_INDEX = "CREATE INDEX IF NOT EXISTS queue_position ON queue (position)"
+
+
+def inbox_unchanged(path, digest):
+    """
+    whether the file still holds the bytes with this sha1
+    """
+    try:
+        with open(path, 'rb') as f_inbox:
+            return hashlib.sha1(f_inbox.read()).hexdigest() == digest
+    except FileNotFoundError:
+        return False
+
+
+class TweetQueue:
+    """
+    first in first out queue of {"img", "text"} drafts plus the history of
+    posted ones.  Drafts are posted in order of position (an indexed
+    lookup), and posting moves a row from queue to tweeted in a single
+    transaction.  Ids stay the same when drafts are reordered.
+    """
+
+    def __init__(self, path=TWEET_DB):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        columns = {row[1] for row in
+                   self.connection.execute("PRAGMA table_info(queue)")}
+        if "position" not in columns:
+            with self.connection:
+                self.connection.execute(
+                    "ALTER TABLE queue ADD COLUMN position INTEGER")
+                self.connection.execute("UPDATE queue SET position = id")
+        self.connection.execute(QUEUE_INDEX)
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM queue").fetchone()[0]
+
+    def peek(self, limit=1):
+        """
+        the next drafts in line (as dicts with id, img and text),
+        all of them if limit is None
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, img, text FROM queue ORDER BY position, id "
+                "LIMIT ?", (-1 if limit is None else limit,)).fetchall()
+        return list(map(dict, rows))
+
+    def push(self, tweets):
+        """
+        add drafts at the back of the queue
+        """
+        with self.lock, self.connection:
+            self.__insert(tweets)
+
+    def remove(self, entry_id):
+        """
+        drop a queued draft, False if there's no such draft
+        """
+        with self.lock, self.connection:
+            removed = self.connection.execute(
+                "DELETE FROM queue WHERE id = ?", (entry_id,)).rowcount
+            self.connection.execute(
+                "DELETE FROM media WHERE entry_id = ?", (entry_id,))
+        return removed > 0
+
+    def move(self, entry_id, position):
+        """
+        move a queued draft to a position in line (1 is posted next,
+        past the end moves it to the back), False if there's no such draft
+        """
+        with self.lock, self.connection:
+            ids = [row[0] for row in self.connection.execute(
+                "SELECT id FROM queue ORDER BY position, id")]
+            if entry_id not in ids:
+                return False
+            ids.remove(entry_id)
+            ids.insert(max(position, 1) - 1, entry_id)
+            self.connection.executemany(
+                "UPDATE queue SET position = ? WHERE id = ?",
+                [(index, queued) for index, queued in enumerate(ids, 1)])
+        return True
+
+    def mark_posted(self, entry_id):
+        """
+        atomically move a draft from the queue to the tweeted history
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO tweeted (img, text, tweeted_at) "
+                "SELECT img, text, ? FROM queue WHERE id = ?",
+                (int(time.time()), entry_id))
+            self.connection.execute(
+                "DELETE FROM queue WHERE id = ?", (entry_id,))
+            self.connection.execute(
+                "DELETE FROM media WHERE entry_id = ?", (entry_id,))
+
+    def set_media(self, entry_id, media_id, expires_at):
+        """
+        remember the media_id uploaded ahead of time for a draft
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO media (entry_id, media_id, expires_at) "
+                "VALUES (?, ?, ?)", (entry_id, str(media_id), int(expires_at)))
+
+    def media(self, entry_id, valid_until):
+        """
+        the pre-uploaded media_id of a draft, if it is still valid
+        at the given time
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT media_id FROM media "
+                "WHERE entry_id = ? AND expires_at > ?",
+                (entry_id, int(valid_until))).fetchone()
+        return row[0] if row else None
+
+    def forget_media(self, entry_id):
+        """
+        drop a pre-uploaded media_id (e.g. twitter no longer accepts it)
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM media WHERE entry_id = ?", (entry_id,))
+
+    def import_inbox(self, path, raw=None):
+        """
+        move the drafts in a tweets.json style file into the queue, then
+        empty the file.  The file's hash is committed with the rows, so a
+        crash before the file is emptied can't import it twice.  If the
+        file is saved again while this runs, nothing is imported and the
+        file is left for the next call, so the edit isn't lost.
+        raw: the file's bytes as already read (and validated) by the
+        caller, only imported if the file still holds them
+        returns the number of drafts imported
+        """
+        if raw is None:
+            if not os.path.exists(path):
+                return 0
+            with open(path, 'rb') as f_inbox:
+                raw = f_inbox.read()
+        tweets = json.loads(raw or b'[]')
+        if not tweets:
+            return 0
+        digest = hashlib.sha1(raw).hexdigest()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'inbox'").fetchone()
+            imported = row is None or row[0] != digest
+            try:
+                if imported:
+                    self.__insert(tweets)
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) "
+                        "VALUES ('inbox', ?)", (digest,))
+                # checked before committing, so an edit saved meanwhile
+                # is imported whole by the next call instead
+                if not inbox_unchanged(path, digest):
+                    self.connection.rollback()
+                    return 0
+            except Exception:
+                self.connection.rollback()
+                raise
+            self.connection.commit()
+        if not inbox_unchanged(path, digest):
+            # saved in the instant since the commit: keep the edit, the
+            # drafts above may be queued again with it
+            return len(tweets) if imported else 0
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f_inbox:
+            f_inbox.write(json.dumps([], indent=4))
+        os.replace(tmp_path, path)
+        # the file is empty now, so the same drafts can be re-added later
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM meta WHERE key = 'inbox'")
+        return len(tweets) if imported else 0
+
+    def import_history(self, path):
+        """
+        one-off import of an existing tweeted.json into the history,
+        the file is renamed so it won't be imported again
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r') as f_tweeted:
+            tweets = json.load(f_tweeted)
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO tweeted (img, text) VALUES (?, ?)",
+                [(tweet["img"], tweet["text"]) for tweet in tweets])
+        os.replace(path, f'{path}.imported')
+        return len(tweets)
+
+    def close(self):
+        """
+        close the database
+        """
+        with self.lock:
+            self.connection.close()
+
+    def __insert(self, tweets):
+        self.connection.executemany(
+            "INSERT INTO queue (img, text, position) "
+            "SELECT ?, ?, COALESCE(MAX(position), 0) + 1 FROM queue",
+            [(tweet["img"], tweet["text"]) for tweet in tweets])
@@ -3,77 +3,194 @@ A long running service pertaining to posting a tweet
 """
 import json
 import os
+import threading
+import time
 import requests
-from static.constants import MEDIA_UPLOAD_URL, STATUS_UPDATE_URL
+from static.constants import STATUS_UPDATE_URL
+from static import metrics
 from static.logger import logging
-from static.logger import res_err
+from static.logger import res_ok
+from tweet.mediacache import MediaCache
+from tweet.mediaupload import MediaUploader
+from tweet.tweetqueue import TweetQueue
 
 TWEETS = "cached/tweets/tweets.json"
 TWEETED = "cached/tweets/tweeted.json"
+PICTURES = "resources/pictures"
+INBOX_POLL_SECONDS = 10
+# how many queued tweets get their media uploaded ahead of time
+PREFETCH_COUNT = 2
+# a pre-uploaded media_id must stay valid at least this long to be used
+MEDIA_EXPIRY_MARGIN_SECONDS = 10 * 60
+
+
+def validate_drafts(tweets, first=0):
+    """
+    list of problems with the drafts (tweets.json's content), empty if
+    they're all good
+    first: the number the drafts are counted from in the messages
+    """
+    if not isinstance(tweets, list):
+        return ["expected a list of tweets"]
+    errors = []
+    for index, tweet in enumerate(tweets, first):
+        if not isinstance(tweet, dict):
+            errors.append(f'#{index} is not an object')
+            continue
+        img = tweet.get("img")
+        text = tweet.get("text")
+        if not isinstance(text, str) or not text:
+            errors.append(f'#{index} has no "text"')
+        if not isinstance(img, str) or not img:
+            errors.append(f'#{index} has no "img"')
+        elif not os.path.isfile(f'{PICTURES}/{img}'):
+            errors.append(f'#{index} picture {PICTURES}/{img} is missing')
+    return errors
 
 
 class TweetService:  # pylint: disable=too-few-public-methods
     """
     the this is a long running service which will post tweets
-    from the cached/tweets/tweets.json map.
+    drafted in cached/tweets/tweets.json (queued in cached/tweets/tweets.db)
     """
 
-    def __init__(self, session: requests.Session):
+    def __init__(self, session: requests.Session, queue: TweetQueue = None):
         self.session = session
-        self.tweeted = []
-        self.tweets = []
+        self.queue = queue if queue is not None else TweetQueue()
+        self.uploader = MediaUploader(session)
+        self.media_cache = MediaCache()
+        # bring over the history of the json based queue, if any
+        self.queue.import_history(TWEETED)
+        # (mtime, size) of tweets.json when it was last looked at
+        self.inbox_signature = None
+        self.inbox_lock = threading.Lock()
 
     def tweet(self):
         """
-        fetch from local json
-        post the first tweet in the list
+        pick up new drafts from tweets.json
+        post the first tweet in the queue
         then record that the tweet was tweeted
         """
-        self.__refresh_local_tweets()
+        self.refresh()
 
-        if not self.tweets:
+        pending = self.queue.peek()
+        if not pending:
             return
 
-        tweet_obj = self.tweets[0]
+        tweet_obj = pending[0]
 
-        # upload picture
-        media_id = self.__upload_media(tweet_obj["img"])
+        # picture (uploaded ahead of time by prefetch, when possible)
+        media_id, prefetched = self.__media_for(tweet_obj)
+        if not media_id:
+            return
 
         # tweet with text, and image
-        if not media_id:
+        posted = self.__post_status(tweet_obj["text"], media_id)
+        if not posted and prefetched:
+            # the pre-uploaded media may have expired early, upload again
+            self.queue.forget_media(tweet_obj["id"])
+            media_id, _ = self.__media_for(tweet_obj)
+            posted = media_id and self.__post_status(
+                tweet_obj["text"], media_id)
+        if not posted:
             return
-        self.__post_status(tweet_obj["text"], media_id)
 
-        self.tweets.remove(tweet_obj)
-        self.tweeted.append(tweet_obj)
-        self.__update_local_tweets()
+        self.queue.mark_posted(tweet_obj["id"])
+        metrics.inc("job_items_total", job="tweet", action="post")
 
-    def __refresh_local_tweets(self):
+    def prefetch(self, count=PREFETCH_COUNT):
         """
-        fetch latest tweets saved from json
+        upload the media of the next queued tweets ahead of their slot,
+        so posting only needs statuses/update
         """
-        f_tweets = open(f'{TWEETS}', 'r')
-        f_tweeted = open(f'{TWEETED}', 'r')
-
-        try:
-            self.tweets = json.load(f_tweets)
-            self.tweeted = json.load(f_tweeted)
-        finally:
-            f_tweets.close()
-            f_tweeted.close()
-
-    def __update_local_tweets(self):
+        self.refresh()
+        upcoming = self.queue.peek(limit=count)
+        # let the pictures be normalized in parallel before uploading
+        for tweet_obj in upcoming:
+            self.media_cache.submit(f'{PICTURES}/{tweet_obj["img"]}')
+        for tweet_obj in upcoming:
+            self.__media_for(tweet_obj)
+
+    def __media_for(self, tweet_obj):
+        """
+        (media_id, whether it was pre-uploaded) for a queued tweet,
+        uploading it now if there is no valid pre-uploaded one
+        """
+        valid_until = time.time() + MEDIA_EXPIRY_MARGIN_SECONDS
+        media_id = self.queue.media(tweet_obj["id"], valid_until)
+        if media_id:
+            return (media_id, True)
+
+        uploaded = self.__upload_media(tweet_obj["img"])
+        if not uploaded:
+            return (None, False)
+        media_id, expires_at = uploaded
+        self.queue.set_media(tweet_obj["id"], media_id, expires_at)
+        metrics.inc("job_items_total", job="tweet", action="upload")
+        return (media_id, False)
+
+    def refresh(self):
         """
-        record the modified tweet/tweeted structures on disk
+        import tweets.json into the queue, only if the file changed since
+        the last look.  Drafts are validated first, and nothing is imported
+        (the file is left as is) until every draft is valid.
+        returns the number of drafts queued
         """
-        f_tweets = open(f'{TWEETS}', 'w')
-        f_tweeted = open(f'{TWEETED}', 'w')
+        with self.inbox_lock:
+            signature = self.__inbox_signature()
+            if signature is None or signature == self.inbox_signature:
+                return 0
+            self.inbox_signature = signature
+
+            try:
+                with open(TWEETS, 'rb') as f_tweets:
+                    raw = f_tweets.read()
+                tweets = json.loads(raw or b'[]')
+            except FileNotFoundError:
+                return 0
+            except ValueError as err:
+                logging.error('%s is not valid json: %s', TWEETS, err)
+                return 0
+            errors = validate_drafts(tweets)
+            for error in errors:
+                logging.error('%s: %s', TWEETS, error)
+            if errors:
+                return 0
+
+            # exactly the bytes validated above (the queue leaves the file
+            # alone if it was saved again since)
+            imported = self.queue.import_inbox(TWEETS, raw)
+            if imported:
+                self.inbox_signature = self.__inbox_signature()
+        if imported:
+            logging.info('queued %s new tweets', imported)
+        return imported
+
+    def watch(self, interval=INBOX_POLL_SECONDS):
+        """
+        poll tweets.json in the background, so edits are picked up (and
+        mistakes reported) within seconds rather than at posting time
+        """
+        def poll():
+            while True:
+                try:
+                    self.refresh()
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception('could not refresh %s', TWEETS)
+                time.sleep(interval)
+
+        watcher = threading.Thread(
+            target=poll, name="tweets-inbox", daemon=True)
+        watcher.start()
+        return watcher
+
+    @staticmethod
+    def __inbox_signature():
         try:
-            f_tweets.write(json.dumps(self.tweets, sort_keys=True, indent=4))
-            f_tweeted.write(json.dumps(self.tweeted, sort_keys=True, indent=4))
-        finally:
-            f_tweets.close()
-            f_tweeted.close()
+            stat = os.stat(TWEETS)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
 
     def __post_status(self, text, media_id):
         """
@@ -84,68 +201,15 @@ class TweetService:  # pylint: disable=too-few-public-methods
             "media_ids": ",".join(map(str, [media_id]))
         }
         response = self.session.post(STATUS_UPDATE_URL, data=params)
-        res_err(response, "POSTING THE TWEET AFTER MEDIA UPLOAD")
-        logging.info(f'posted {text}')
+        if not res_ok(response, "POSTING THE TWEET AFTER MEDIA UPLOAD"):
+            return False
+        logging.info('posted %s', text)
+        return True
 
     def __upload_media(self, file_name):
         """
-        Using https://github.com/twitterdev/large-video-upload-python/blob/master/async-upload.py
-        as a resource
+        chunked upload of a picture (normalized first, see MediaCache),
+        returns (media_id, expires_at)
         """
-        file_path = f'resources/pictures/{file_name}'
-        file_size = os.path.getsize(file_path)
-
-        # INIT
-        params = {
-            "command": "INIT",
-            "media_type": "image/jpeg",
-            "total_bytes": file_size
-        }
-        init_response = self.session.post(MEDIA_UPLOAD_URL, data=params)
-        res_err(init_response, "MEDIA UPLOAD INIT")
-        if init_response.status_code < 200 or init_response.status_code > 299:
-            return None
-        logging.info(f'{file_name} INIT succeeded')
-        media_id = init_response.json()['media_id']
-
-        # APPEND CHUNKED
-        segment_id = 0
-        bytes_sent = 0
-        media_file = open(file_path, 'rb')
-        try:
-            while bytes_sent < file_size:
-                # read 4MB at a time
-                chunk = media_file.read(4*1024*1024)
-                params = {
-                    "command": "APPEND",
-                    "media_id": media_id,
-                    "segment_index": segment_id
-                }
-
-                files = {
-                    "media": chunk
-                }
-                chunk_res = self.session.post(
-                    MEDIA_UPLOAD_URL, data=params, files=files)
-                res_err(chunk_res, "MEDIA UPLOAD APPEND")
-                res_err(chunk_res, f'({bytes_sent}/{file_size}) {file_path}')
-                if chunk_res.status_code < 200 or chunk_res.status_code > 299:
-                    return None
-
-                segment_id = segment_id + 1
-                bytes_sent = media_file.tell()
-        finally:
-            media_file.close()
-        logging.info(f'{file_name} CHUNK succeeded')
-        # FINALIZE
-        params = {
-            "command": "FINALIZE",
-            "media_id": media_id,
-        }
-        fin_res = self.session.post(MEDIA_UPLOAD_URL, data=params)
-        res_err(fin_res, "MEDIA UPLOAD FINALIZE")
-        if fin_res.status_code < 200 or fin_res.status_code > 299:
-            return None
-        logging.info(f'{file_name} {media_id} FINALIZE succeeded')
-        # RETURN MEDIA_ID
-        return media_id
+        file_path = self.media_cache.prepare(f'{PICTURES}/{file_name}')
+        return self.uploader.upload(file_path)
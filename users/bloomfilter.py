@@ -0,0 +1,92 @@
+"""
+A bloom filter over int64 ids: a quick, compact "definitely not seen"
+answer in front of an exact (slower, on disk) index
+"""
+import math
+import os
+import struct
+
+ERROR_RATE = 0.01
+MASK = (1 << 64) - 1
+# bits, hashes, ids added
+HEADER = struct.Struct("<QII")
+
+
+def mix(value):
+    """
+    splitmix64 finalizer, spreads sequential ids over the whole range
+    """
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+class BloomFilter:
+    """
+    `hashes` bit positions per id, from double hashing of two mixes
+    """
+    __slots__ = ("size", "hashes", "bits", "count")
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate)
+                                / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __positions(self, user_id):
+        first = mix(user_id & MASK)
+        second = mix(first) | 1
+        for index in range(self.hashes):
+            yield (first + index * second) % self.size
+
+    def add(self, user_id):
+        """
+        set the id's bits
+        """
+        bits = self.bits
+        for pos in self.__positions(user_id):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count = self.count + 1
+
+    def __contains__(self, user_id):
+        bits = self.bits
+        for pos in self.__positions(user_id):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def saturated(self):
+        """
+        whether more ids than it was sized for were added (beyond that,
+        the false positive rate climbs past ERROR_RATE)
+        """
+        bits_per_id = -math.log(ERROR_RATE) / (math.log(2) ** 2)
+        return self.count * bits_per_id > self.size
+
+    def save(self, path):
+        """
+        write the filter to disk, atomically replacing the old one
+        """
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f_bloom:
+            f_bloom.write(HEADER.pack(self.size, self.hashes, self.count))
+            f_bloom.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        read a filter written by save(), None if there is none
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f_bloom:
+            size, hashes, count = HEADER.unpack(f_bloom.read(HEADER.size))
+            bits = bytearray(f_bloom.read())
+        bloom = cls(1)
+        bloom.size, bloom.hashes, bloom.count = size, hashes, count
+        bloom.bits = bits
+        return bloom
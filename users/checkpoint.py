@@ -0,0 +1,44 @@
+"""
+Persisted progress of a job, so a restart or a failed request resumes
+where the job left off instead of starting over
+"""
+import json
+import os
+
+CHECKPOINTS = "cached/checkpoints"
+
+
+class Checkpoint:
+    """
+    the state of one job (cursors, pending work...) as json under
+    cached/checkpoints/<job>.json
+    """
+
+    def __init__(self, job, directory=CHECKPOINTS):
+        self.path = os.path.join(directory, f'{job}.json')
+
+    def load(self):
+        """
+        the saved state, empty if the job has nothing to resume
+        """
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r') as f_state:
+            return json.load(f_state)
+
+    def save(self, state):
+        """
+        persist the state, atomically replacing the previous one
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f_state:
+            f_state.write(json.dumps(state))
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """
+        the job completed, nothing to resume
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
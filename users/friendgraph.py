@@ -0,0 +1,136 @@
+"""
+A local snapshot of the user's friend/follower graph, so a purge
+doesn't need to page through the whole graph on every run
+"""
+import json
+import os
+import time
+from array import array
+from users.idset import IdSet, TYPECODE
+
+GRAPH = "cached/graph.json"
+# a full re-page is forced once a snapshot is this old, since departures
+# (people who stopped following) can't be seen from the newest pages alone
+FULL_REFRESH_SECONDS = 7 * 24 * 60 * 60
+
+FRIENDS = "friends"
+FOLLOWERS = "followers"
+
+
+class FriendGraph:
+    """
+    keeps the ids of friends and followers, with the last time each id
+    was seen, persisted as json under cached/.
+    Ids are kept in an IdSet with a parallel array of seen timestamps.
+    """
+
+    def __init__(self, path=GRAPH):
+        self.path = path
+        self.ids = {FRIENDS: IdSet(), FOLLOWERS: IdSet()}
+        self.seen = {FRIENDS: array(TYPECODE), FOLLOWERS: array(TYPECODE)}
+        self.refreshed = {FRIENDS: 0, FOLLOWERS: 0}
+        self.load()
+
+    def load(self):
+        """
+        read the snapshot from disk (a missing file is an empty graph)
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f_graph:
+            raw = json.load(f_graph)
+        for kind in (FRIENDS, FOLLOWERS):
+            entry = raw.get(kind, {})
+            self.ids[kind] = IdSet.from_sorted(
+                array(TYPECODE, entry.get("ids", [])))
+            self.seen[kind] = array(TYPECODE, entry.get("seen", []))
+            self.refreshed[kind] = raw.get("refreshed", {}).get(kind, 0)
+
+    def save(self):
+        """
+        write the snapshot to disk, atomically replacing the old one
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        raw = {"refreshed": self.refreshed}
+        for kind in (FRIENDS, FOLLOWERS):
+            raw[kind] = {
+                "ids": self.ids[kind].ids.tolist(),
+                "seen": self.seen[kind].tolist()
+            }
+        tmp_path = f'{self.path}.tmp'
+        # dumps, not dump: dump streams through the pure python encoder
+        with open(tmp_path, 'w') as f_graph:
+            f_graph.write(json.dumps(raw))
+        os.replace(tmp_path, self.path)
+
+    def needs_full_refresh(self, kind):
+        """
+        whether the snapshot for this kind is too old to be topped up
+        """
+        return time.time() - self.refreshed[kind] > FULL_REFRESH_SECONDS
+
+    def known(self, kind, user_id):
+        """
+        whether the id is already in the snapshot
+        """
+        return user_id in self.ids[kind]
+
+    def merge(self, kind, user_ids):
+        """
+        top up the snapshot with ids from the newest pages,
+        returns how many of them were new
+        """
+        now = int(time.time())
+        added = 0
+        for user_id in user_ids:
+            if self.__touch(kind, user_id, now):
+                added = added + 1
+        return added
+
+    def replace(self, kind, user_ids):
+        """
+        replace the snapshot with the result of a full re-page
+        """
+        now = int(time.time())
+        self.ids[kind] = IdSet(user_ids)
+        self.seen[kind] = array(TYPECODE, [now]) * len(self.ids[kind])
+        self.refreshed[kind] = now
+
+    def add_friend(self, user_id):
+        """
+        record a follow made by this program
+        """
+        self.__touch(FRIENDS, user_id, int(time.time()))
+
+    def remove_friend(self, user_id):
+        """
+        record an unfollow made by this program
+        """
+        pos = self.ids[FRIENDS].discard(user_id)
+        if pos >= 0:
+            del self.seen[FRIENDS][pos]
+
+    def friend_ids(self):
+        """
+        ids the user currently follows (a copy)
+        """
+        return IdSet.from_sorted(array(TYPECODE, self.ids[FRIENDS].ids))
+
+    def follower_ids(self):
+        """
+        ids currently following the user (a copy)
+        """
+        return IdSet.from_sorted(array(TYPECODE, self.ids[FOLLOWERS].ids))
+
+    def __touch(self, kind, user_id, now):
+        """
+        mark the id as seen now, returns whether it was new
+        """
+        pos, inserted = self.ids[kind].add(user_id)
+        if inserted:
+            self.seen[kind].insert(pos, now)
+        else:
+            self.seen[kind][pos] = now
+        return inserted
@@ -2,7 +2,8 @@
 Aids with managing friends of a user
 """
 import os
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from static.constants import TRENDS_URL, FRIENDS_URL, FOLLOWERS_URL
 from static.constants import USER_SEARCH_URL, FRIENDSHIP_CREATE_URL
@@ -10,43 +11,152 @@ from static.constants import FRIENDSHIP_DESTROY_URL, TWEET_SEARCH_URL
 from static.constants import TWEET_LIKE_URL, TWEET_UNLIKE_URL
 from static.constants import RETWEET_URL, REMOVE_RETWEET_URL
 from static.constants import FAVOURITED_TWEETS_URL
+from static.constants import FRIEND_IDS_URL, FOLLOWER_IDS_URL
+from static.constants import FRIENDSHIP_LOOKUP_URL
+from static import metrics
 from static.logger import logging
 from static.logger import res_err
+from static.logger import res_ok
+from network.projection import decode_search, decode_tweets
+from network.projection import decode_users_page, decode_relationships
+from users.checkpoint import Checkpoint
+from users.friendgraph import FriendGraph, FRIENDS, FOLLOWERS
+from users.handledids import HandledIds, FOLLOWED, UNFOLLOWED, LIKED
+from users.watermarks import Watermarks
 import static.env
 
 SCREEN_NAME = os.getenv("auth_user_screen_name")
-FOLLOW_THROTTLE_SECONDS = 30
-UNFOLLOW_THROTTLE_SECONDS = 30
-UNLIKE_THROTTLE_SECONDS = 30
+# page sizes / batch sizes allowed by the id based endpoints
+IDS_PAGE_SIZE = 5000
+LOOKUP_BATCH_SIZE = 100
+# tweets per create, split between the trends' searches
+SEARCH_COUNT = 100
+# how often (in items) the follow/unfollow loops checkpoint their progress
+CHECKPOINT_EVERY = 10
+# unfollows per purge (see jobscheduler/timetable.py), the rest of the
+# candidates wait for the next purge's diff
+UNFOLLOWS_PER_PURGE = 600
+# only 1 in this many failures of the same per item call is logged
+# (the metrics still count every one)
+LOOP_LOG_SAMPLE = 10
 
 
 class FriendshipService:
     """
     Long running service that will create friends or remove friends
     (in order to get more followers)
+
+    Pacing is left to the session, see network.ratelimit.RateLimitedSession
     """
 
-    def __init__(self, session: requests.Session):
+    def __init__(self, session: requests.Session, graph: FriendGraph = None,
+                 use_ids=True, watermarks: Watermarks = None,
+                 handled: HandledIds = None):
+        """
+        use_ids: diff the graph with the id endpoints (5000 per page) and
+        confirm with bulk friendship lookups (a batch at a time, as the
+        unfollows get to it), instead of paging full user objects (200 per
+        page) from the list endpoints
+        """
         self.session = session
+        self.graph = graph if graph is not None else FriendGraph()
+        self.use_ids = use_ids
+        self.watermarks = \
+            watermarks if watermarks is not None else Watermarks()
+        # users followed/unfollowed and tweets liked by past runs
+        self.handled = handled if handled is not None else HandledIds()
+        self.create_checkpoint = Checkpoint("create")
+        self.purge_checkpoint = Checkpoint("purge")
+        # the graph and the purge state, while both id streams are paged at
+        # once (see __sync_graph)
+        self.lock = threading.RLock()
 
     def create(self):
         """
         add friends based on the latest trends
+        (resumes the follows/likes left over from an interrupted run first)
+        """
+        state = self.create_checkpoint.load()
+        pending = state.get("pending")
+        if pending is None:
+            pending = self.__find_friends()
+            if pending is None:
+                return
+            self.create_checkpoint.save({"pending": pending})
+            # only once the work is checkpointed, or a crash loses it
+            self.watermarks.save()
+        else:
+            logging.info('resuming create with %s pending', len(pending))
+
+        logging.info('adding %s friends', len(pending))
+        logging.info('liking %s tweets', len(pending))
+        # follow all those memcached users (skipping those already handled)
+        saved = 0
+        try:
+            for index, (user_id, tweet_id) in enumerate(pending):
+                saved = saved + self.__follow_once(user_id)
+                saved = saved + self.__like_once(tweet_id)
+                if (index + 1) % CHECKPOINT_EVERY == 0:
+                    self.create_checkpoint.save(
+                        {"pending": pending[index + 1:]})
+                    self.graph.save()
+                    self.handled.checkpoint()
+        finally:
+            self.graph.save()
+            self.handled.save()
+        self.create_checkpoint.clear()
+        logging.info('skipped %s follows/likes already handled', saved)
+
+    def __follow_once(self, user_id):
+        """
+        follow the user, unless they're a friend already or were followed
+        or unfollowed before.  returns 1 if the call was saved, else 0
+        """
+        if self.graph.known(FRIENDS, user_id):
+            reason = "friend"
+        elif self.handled.seen(FOLLOWED, user_id):
+            reason = FOLLOWED
+        elif self.handled.seen(UNFOLLOWED, user_id):
+            reason = UNFOLLOWED
+        else:
+            if self.__follow(user_id):
+                self.graph.add_friend(user_id)
+                self.handled.record(FOLLOWED, user_id)
+                metrics.inc("job_items_total", job="create", action="follow")
+            return 0
+        metrics.inc("calls_saved_total", action="follow", reason=reason)
+        return 1
+
+    def __like_once(self, tweet_id):
+        """
+        like the tweet, unless it was liked before.
+        returns 1 if the call was saved, else 0
+        """
+        if self.handled.seen(LIKED, tweet_id):
+            metrics.inc("calls_saved_total", action="like", reason=LIKED)
+            return 1
+        if self.__like(tweet_id):
+            self.handled.record(LIKED, tweet_id)
+            metrics.inc("job_items_total", job="create", action="like")
+        return 0
+
+    def __find_friends(self):
+        """
+        [user_id, tweet_id] pairs to follow/like from the top trends' tweets
         """
         # fetch the most popular trends on twitter (Canada)
         # file = open("mock/trends_ottawa.json", "r")
         # trends = json.load(file)[0]["trends"]
         # file.close()
         trends_res = self.session.get(f'{TRENDS_URL}?id=23424775')
-        res_err(trends_res, "fetching trends")
-        if trends_res.status_code < 200 or trends_res.status_code > 299:
-            return
+        if not res_ok(trends_res, "fetching trends"):
+            return None
         trends = trends_res.json()[0]["trends"]
 
         # perform a user lookup based on the top trends
         # (memcache those users?)
         top_trends = trends[0:3]
-        logging.info(f'top trends are: {top_trends}')
+        logging.info('top trends are: %s', top_trends)
 
         # look for users who have hardcoded trend information in their profile
         # user_ids = []
@@ -61,162 +171,336 @@ class FriendshipService:
         #     ids = map(lambda user: user["id"], users)
         #     user_ids.extend(ids)
 
-        # look for unique users related to the trends
-        trend_query = "%20OR%20".join(
-            map(lambda trend: trend["query"], top_trends))
-        tweets = self.__search_tweets(query=trend_query)
+        # look for unique users related to the trends, one search per
+        # trend so each only returns tweets newer than its last run's
+        queries = list(map(lambda trend: trend["query"], top_trends))
+        count = max(1, SEARCH_COUNT // max(1, len(queries)))
+        tweets = []
+        for query in queries:
+            found = self.__search_tweets(
+                query=query, since_id=self.watermarks.since_id(query),
+                count=count)
+            if found:
+                self.watermarks.advance(query, [tweet.id for tweet in found])
+                tweets.extend(found)
+        if not tweets:
+            return None
         user_tweet_map = {}
         for tweet in tweets:
-            user_tweet_map[tweet["user"]["id"]] = tweet
-        logging.info(f'adding {len(user_tweet_map)} friends')
-        logging.info(f'liking {len(user_tweet_map)} tweets')
-        # follow all those memcached users
-        for user_id, tweet in user_tweet_map.items():
-            self.__follow(user_id)
-            self.__like(tweet)
-            # throttle
-            time.sleep(FOLLOW_THROTTLE_SECONDS)
+            user_tweet_map[tweet.user_id] = tweet.id
+        return [[user_id, tweet_id]
+                for user_id, tweet_id in user_tweet_map.items()]
 
     def purge(self):
         """
         remove friends, unlike tweets of friends that have not followed back
+
+        Progress (paging cursors, pending unfollows, the unlike position)
+        is checkpointed, so an interrupted purge resumes where it stopped.
         """
-        # fetch all the user's friends
-        friends = []
-        next_cursor = -1
-        while next_cursor != 0:
-            pair = self.__fetch_friends(cursor=next_cursor)
-            if pair is None:
+        state = self.purge_checkpoint.load()
+        if state:
+            logging.info('resuming purge at the %s stage', state["stage"])
+        else:
+            state = {"stage": "sync", "synced": []}
+        if state["stage"] == "sync":
+            # top up the local graph snapshot with the newest pages
+            # (or re-page everything when the snapshot is too old)
+            if not self.__sync(state):
                 return
-            next_cursor = pair[0]
-            friends.extend(pair[1])
-            time.sleep(5)
+            state = {"stage": "unfollow", "pending": [], "attempted": 0,
+                     "candidates": list(self.__unfollow_candidates())}
+            self.purge_checkpoint.save(state)
 
-        # fetch all the user's followers
-        followers = []
-        next_cursor = -1
-        while next_cursor != 0:
-            pair = self.__fetch_followers(cursor=next_cursor)
-            if pair is None:
-                return
-            next_cursor = pair[0]
-            followers.extend(pair[1])
-            time.sleep(5)
-
-        # friends_file = open('mock/friends1.json', 'r')
-        # followers_file = open('mock/followers1.json', 'r')
-        # friends_json = json.load(friends_file)
-        # followers_json = json.load(followers_file)
-        # friends_file.close()
-        # followers_file.close()
-        # friends = friends_json['users']
-        # followers = followers_json['users']
-
-        # identify those who are not "followed_by"
-        friend_ids = set(map(lambda user: user['id'], friends))
-        follower_ids = set(map(lambda user: user['id'], followers))
+        if state["stage"] == "unfollow":
+            self.__unfollow_all(state)
+            state = {"stage": "unlike", "max_id": None, "pages": 0}
+            self.purge_checkpoint.save(state)
+
+        self.__unlike_all(state)
+        self.purge_checkpoint.clear()
+        logging.info('purge completed')
+
+    def __sync(self, state):
+        """
+        page friends and followers at the same time, on a worker thread
+        each (they have separate rate limits, so a large graph syncs in
+        about half the time), False if a page failed
+        """
+        pending = [kind for kind in (FRIENDS, FOLLOWERS)
+                   if kind not in state["synced"]]
+        if len(pending) < 2:
+            return all(self.__sync_graph(kind, state) for kind in pending)
+        with ThreadPoolExecutor(max_workers=len(pending),
+                                thread_name_prefix="purge-sync") as pool:
+            synced = list(pool.map(
+                lambda kind: self.__sync_graph(kind, state), pending))
+        return all(synced)
+
+    def __unfollow_candidates(self):
+        """
+        identify those who are not "followed_by" (in the snapshot, see
+        __confirm_unfollow)
+        """
+        friend_ids = self.graph.friend_ids()
+        follower_ids = self.graph.follower_ids()
         users_to_unfollow = friend_ids - follower_ids
 
-        logging.info(f'{len(friend_ids)} friends')
-        logging.info(f'{len(follower_ids)} followers')
+        logging.info('%s friends', len(friend_ids))
+        logging.info('%s followers', len(follower_ids))
+        return users_to_unfollow
 
-        logging.info(f'removing {len(users_to_unfollow)} friends')
-        # unfollow all those users
-        for user_id in users_to_unfollow:
-            self.__unfollow(user_id)
-            # unfollow throttle
-            time.sleep(UNFOLLOW_THROTTLE_SECONDS)
+    def __unfollow_all(self, state):
+        """
+        unfollow up to UNFOLLOWS_PER_PURGE of the candidates, confirming
+        them a lookup batch at a time just before they're unfollowed.
+        state: the candidates not confirmed yet, the confirmed ids not
+        unfollowed yet (pending) and how many unfollows were tried,
+        checkpointed after every lookup and every CHECKPOINT_EVERY unfollows
+        """
+        candidates = state.get("candidates", [])
+        logging.info('removing up to %s of %s friends', UNFOLLOWS_PER_PURGE,
+                     len(candidates) + len(state["pending"]))
+        # The graph is only saved at the end: if that save is lost, the next
+        # purge's lookup drops those ids again
+        try:
+            while state.get("attempted", 0) < UNFOLLOWS_PER_PURGE:
+                if not state["pending"]:
+                    if not candidates:
+                        break
+                    left = UNFOLLOWS_PER_PURGE - state.get("attempted", 0)
+                    size = min(LOOKUP_BATCH_SIZE, left)
+                    batch, candidates = candidates[:size], candidates[size:]
+                    state["candidates"] = candidates
+                    state["pending"] = self.__confirm_unfollow(batch) \
+                        if self.use_ids else batch
+                    self.purge_checkpoint.save(state)
+                    continue
+                self.__unfollow_pending(state)
+        finally:
+            self.graph.save()
+            self.handled.save()
+        if candidates:
+            logging.info('leaving %s candidates to the next purge',
+                         len(candidates))
 
-        # unfavourite all tweets
-        favourites = self.__favourited_tweets()
+    def __unfollow_pending(self, state):
+        pending = state["pending"]
+        for index, user_id in enumerate(pending):
+            if self.__unfollow(user_id):
+                self.graph.remove_friend(user_id)
+                # so create() doesn't follow them again
+                self.handled.record(UNFOLLOWED, user_id)
+                metrics.inc("job_items_total", job="purge",
+                            action="unfollow")
+            state["attempted"] = state.get("attempted", 0) + 1
+            if (index + 1) % CHECKPOINT_EVERY == 0 or \
+                    index + 1 == len(pending):
+                state["pending"] = pending[index + 1:]
+                self.purge_checkpoint.save(state)
+                self.handled.checkpoint()
+
+    def __unlike_all(self, state):
+        """
+        unfavourite all tweets, walking back through the list by max_id
+        """
         unfavourite_limit = 10
-        i = 0
-        while favourites and i <= unfavourite_limit:
-            logging.info(f'unliking {len(favourites)} tweets')
+        favourites = self.__favourited_tweets(max_id=state["max_id"])
+        while favourites and state["pages"] <= unfavourite_limit:
+            logging.info('unliking %s tweets', len(favourites))
             # unlike all favourited tweets
             for tweet in favourites:
-                self.__unlike(tweet)
-                # unlike throttle
-                time.sleep(UNLIKE_THROTTLE_SECONDS)
-            favourites = self.__favourited_tweets()
-            i = i+1
-            time.sleep(1)
+                if self.__unlike(tweet.id):
+                    metrics.inc("job_items_total", job="purge",
+                                action="unlike")
+            state["max_id"] = min(map(lambda tweet: tweet.id, favourites)) - 1
+            state["pages"] = state["pages"] + 1
+            self.purge_checkpoint.save(state)
+            favourites = self.__favourited_tweets(max_id=state["max_id"])
+
+    def __sync_graph(self, kind, state):
+        """
+        page through friends or followers (newest first) into the graph.
+        Stops at the first page with nothing new, unless the snapshot is
+        due a full refresh.  The cursor is checkpointed after every page,
+        so a failed page resumes from there on the next run.
+        Both kinds are paged at once, on two threads sharing the state.
+        """
+        if self.use_ids:
+            fetch = self.__fetch_friend_ids if kind == FRIENDS \
+                else self.__fetch_follower_ids
+        else:
+            fetch = self.__fetch_friends if kind == FRIENDS \
+                else self.__fetch_followers
+        key = f'paging_{kind}'
+        with self.lock:
+            paging = state.get(key)
+            if paging is None:
+                paging = {
+                    "kind": kind,
+                    "full": self.graph.needs_full_refresh(kind),
+                    "cursor": -1,
+                    "seen": []
+                }
+        full = paging["full"]
+        seen = paging["seen"]
+        next_cursor = paging["cursor"]
+        while next_cursor != 0:
+            pair = fetch(cursor=next_cursor)
+            if pair is None:
+                with self.lock:
+                    self.graph.save()
+                return False
+            next_cursor, page_ids = pair
+            metrics.inc("job_items_total", len(page_ids), job="purge",
+                        action=f'fetch_{kind}')
+            with self.lock:
+                seen.extend(page_ids)
+                if not full and self.graph.merge(kind, page_ids) == 0:
+                    break
+                paging["cursor"] = next_cursor
+                state[key] = paging
+                self.purge_checkpoint.save(state)
 
-        logging.info(f'purge completed')
+        with self.lock:
+            if full:
+                self.graph.replace(kind, seen)
+            self.graph.save()
+            state.pop(key, None)
+            state["synced"].append(kind)
+            self.purge_checkpoint.save(state)
+        logging.info('%s: fetched %s ids (full refresh: %s)',
+                     kind, len(seen), full)
+        return True
+
+    def __confirm_unfollow(self, batch):
+        """
+        check a batch (up to 100) of diffed candidates against the live
+        relationship, since the follower snapshot may be behind.  Falls
+        back to the plain diff if the lookup fails.
+        """
+        relationships = self.__lookup_friendships(batch)
+        if relationships is None:
+            return batch
+        confirmed = []
+        for relationship in relationships:
+            user_id = relationship["id"]
+            connections = relationship.get("connections", [])
+            if "following" not in connections:
+                # already unfollowed elsewhere
+                self.graph.remove_friend(user_id)
+            elif "followed_by" in connections:
+                self.graph.merge(FOLLOWERS, [user_id])
+            else:
+                confirmed.append(user_id)
+        logging.debug('%s of %s candidates confirmed',
+                      len(confirmed), len(batch))
+        return confirmed
 
     def __fetch_users(self, query):
         """
         https://developer.twitter.com/en/docs/accounts-and-users/follow-search-get-users/api-reference/get-users-search
         """
         search_res = self.session.get(f'{USER_SEARCH_URL}?q={query}')
-        res_err(search_res, f'searching users with query: {query}')
-        if search_res.status_code < 200 or search_res.status_code > 299:
+        if not res_ok(search_res, 'searching users with query: %s', query):
             return None
         json = search_res.json()
-        logging.info(f'users search with {query} returned {len(json)} results')
+        logging.info('users search with %s returned %s results',
+                     query, len(json))
         return json
 
-    def __search_tweets(self, query):
-        url = f'{TWEET_SEARCH_URL}?q={query}&count=100'
+    def __search_tweets(self, query, since_id=None, count=SEARCH_COUNT):
+        """
+        https://developer.twitter.com/en/docs/tweets/search/api-reference/get-search-tweets
+        """
+        url = f'{TWEET_SEARCH_URL}?q={query}&count={count}'
+        if since_id is not None:
+            url = f'{url}&since_id={since_id}'
         tweets_res = self.session.get(url)
-        res_err(tweets_res, f'searching tweets with query: {query}')
-        if tweets_res.status_code < 200 or tweets_res.status_code > 299:
+        if not res_ok(tweets_res, 'searching tweets with query: %s', query):
             return None
-        tweets = tweets_res.json()["statuses"]
+        tweets = decode_search(tweets_res.content)
 
         # file = open("mock/tweets_hello_100.json", "r")
         # tweets = json.load(file)["statuses"]
         # file.close()
-        logging.info(
-            f'tweet search with {query} returned {len(tweets)} results')
+        logging.info('tweet search with %s returned %s results',
+                     query, len(tweets))
         return tweets
 
     def __fetch_friends(self, cursor=-1):
         # fetch friends
         # https://developer.twitter.com/en/docs/accounts-and-users/follow-search-get-users/api-reference/get-friendships-list
-        friends = []
+        # (only the ids are kept from the user objects)
         url = (f'{FRIENDS_URL}'
                "?count=200"
                f'&cursor={cursor}'
                f'&screen_name={SCREEN_NAME}')
         r_friends = self.session.get(url)
-        res_err(r_friends, "fetching people user is following")
-        if r_friends.status_code < 200 or r_friends.status_code > 299:
+        if not res_ok(r_friends, "fetching people user is following"):
             return None
-        res = r_friends.json()
-        next_cursor = res["next_cursor"]
-        friends = res["users"]
-        return (next_cursor, friends)
+        return decode_users_page(r_friends.content)
 
     def __fetch_followers(self, cursor=-1):
         # fetch followers
         # https://developer.twitter.com/en/docs/accounts-and-users/follow-search-get-users/api-reference/get-followers-list
-        followers = []
-        next_cursor = -1
+        # (only the ids are kept from the user objects)
         url = (f'{FOLLOWERS_URL}'
                "?count=200"
                f'&cursor={cursor}'
                f'&screen_name={SCREEN_NAME}')
         r_followers = self.session.get(url)
-        res_err(r_followers, "fetching user's followers")
-        if r_followers.status_code < 200 or r_followers.status_code > 299:
+        if not res_ok(r_followers, "fetching user's followers"):
             return None
-        res = r_followers.json()
-        followers = res["users"]
-        next_cursor = res["next_cursor"]
-        return (next_cursor, followers)
+        return decode_users_page(r_followers.content)
 
-    def __favourited_tweets(self):
+    def __fetch_friend_ids(self, cursor=-1):
         """
-        https://developer.twitter.com/en/docs/tweets/post-and-engage/api-reference/get-favorites-list
+        https://developer.twitter.com/en/docs/accounts-and-users/follow-search-get-users/api-reference/get-friends-ids
+        """
+        return self.__fetch_ids(
+            FRIEND_IDS_URL, cursor, "fetching ids user is following")
+
+    def __fetch_follower_ids(self, cursor=-1):
+        """
+        https://developer.twitter.com/en/docs/accounts-and-users/follow-search-get-users/api-reference/get-followers-ids
+        """
+        return self.__fetch_ids(
+            FOLLOWER_IDS_URL, cursor, "fetching user's follower ids")
+
+    def __fetch_ids(self, base_url, cursor, msg):
+        url = (f'{base_url}'
+               f'?count={IDS_PAGE_SIZE}'
+               f'&cursor={cursor}'
+               f'&screen_name={SCREEN_NAME}')
+        response = self.session.get(url)
+        if not res_ok(response, msg):
+            return None
+        res = response.json()
+        return (res["next_cursor"], res["ids"])
+
+    def __lookup_friendships(self, user_ids):
         """
+        https://developer.twitter.com/en/docs/accounts-and-users/follow-search-get-users/api-reference/get-friendships-lookup
+        """
+        user_id_list = ",".join(map(str, user_ids))
         response = self.session.get(
-            f'{FAVOURITED_TWEETS_URL}?count=200&screen_name={SCREEN_NAME}')
-        res_err(response, f'fetching favourite tweets')
-        if response.status_code < 200 or response.status_code > 299:
+            f'{FRIENDSHIP_LOOKUP_URL}?user_id={user_id_list}')
+        if not res_ok(response, 'looking up %s friendships', len(user_ids)):
             return None
-        tweets = response.json()
-        return tweets
+        return decode_relationships(response.content)
+
+    def __favourited_tweets(self, max_id=None):
+        """
+        https://developer.twitter.com/en/docs/tweets/post-and-engage/api-reference/get-favorites-list
+        """
+        url = f'{FAVOURITED_TWEETS_URL}?count=200&screen_name={SCREEN_NAME}'
+        if max_id is not None:
+            url = f'{url}&max_id={max_id}'
+        response = self.session.get(url)
+        if not res_ok(response, 'fetching favourite tweets'):
+            return None
+        return decode_tweets(response.content)
 
     def __follow(self, user_id):
         """
@@ -224,7 +508,8 @@ class FriendshipService:
         """
         create_res = self.session.post(
             f'{FRIENDSHIP_CREATE_URL}?user_id={user_id}')
-        res_err(create_res, f'following user: {user_id}')
+        return res_ok(create_res, 'following user: %s', user_id,
+                      sample=LOOP_LOG_SAMPLE)
 
     def __unfollow(self, user_id):
         """
@@ -232,23 +517,26 @@ class FriendshipService:
         """
         destroy_res = self.session.post(
             f'{FRIENDSHIP_DESTROY_URL}?user_id={user_id}')
-        res_err(destroy_res, f'unfollowing user: {user_id}')
+        return res_ok(destroy_res, 'unfollowing user: %s', user_id,
+                      sample=LOOP_LOG_SAMPLE)
 
-    def __like(self, tweet):
+    def __like(self, tweet_id):
         """
         https://developer.twitter.com/en/docs/tweets/post-and-engage/api-reference/post-favorites-create.html
         """
         response = self.session.post(
-            f'{TWEET_LIKE_URL}?id={tweet["id"]}')
-        res_err(response, f'liking tweet: {tweet}')
+            f'{TWEET_LIKE_URL}?id={tweet_id}')
+        return res_ok(response, 'liking tweet: %s', tweet_id,
+                      sample=LOOP_LOG_SAMPLE)
 
-    def __unlike(self, tweet):
+    def __unlike(self, tweet_id):
         """
         https://developer.twitter.com/en/docs/tweets/post-and-engage/api-reference/post-favorites-destroy
         """
         response = self.session.post(
-            f'{TWEET_UNLIKE_URL}?id={tweet["id"]}')
-        res_err(response, f'unliking tweet: {tweet}')
+            f'{TWEET_UNLIKE_URL}?id={tweet_id}')
+        return res_ok(response, 'unliking tweet: %s', tweet_id,
+                      sample=LOOP_LOG_SAMPLE)
 
     def __retweet(self, tweet):
         """
@@ -256,7 +544,7 @@ class FriendshipService:
         """
         response = self.session.post(
             RETWEET_URL.format(tweet_id=tweet["id"]))
-        res_err(response, f'retweeting: {tweet}')
+        res_err(response, 'retweeting: %s', tweet["id"])
 
     def __unretweet(self, tweet):
         """
@@ -264,4 +552,4 @@ class FriendshipService:
         """
         response = self.session.post(
             REMOVE_RETWEET_URL.format(tweet_id=tweet["id"]))
-        res_err(response, f'removing retweet: {tweet}')
+        res_err(response, 'removing retweet: %s', tweet["id"])
@@ -0,0 +1,229 @@
+"""
+Ids this program already acted on (followed, unfollowed, liked), so
+create() doesn't spend rate limited writes on them again.
+
+Each kind is a bloom filter in memory, confirmed against an exact sorted
+int64 file that is binary searched through mmap rather than loaded.  Ids
+recorded during a job are appended to a journal as it goes, and only
+merged into the sorted file (and the filter saved) at the end.
+"""
+import mmap
+import os
+from array import array
+from bisect import bisect_left
+from static import metrics
+from users.bloomfilter import BloomFilter
+from users.idset import IdSet, TYPECODE
+
+HANDLED = "cached/handled"
+INITIAL_CAPACITY = 100000
+
+FOLLOWED = "followed"
+UNFOLLOWED = "unfollowed"
+LIKED = "liked"
+
+
+class IdIndex:
+    """
+    a sorted int64 file, plus the ids added since it was last written
+    (kept in an append only journal next to it until they're merged)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = f'{path}.journal'
+        self.pending = IdSet()
+        # added since the journal was last appended to
+        self.unjournaled = array(TYPECODE)
+        self.mapped = None
+        self.view = None
+        self.__open()
+        self.__replay()
+
+    def __open(self):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size == 0:
+            return
+        with open(self.path, 'rb') as f_index:
+            self.mapped = mmap.mmap(
+                f_index.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mapped).cast(TYPECODE)
+
+    def __replay(self):
+        """
+        the ids a job journaled but didn't get to merge (a crash)
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        journaled = array(TYPECODE)
+        with open(self.journal_path, 'rb') as f_journal:
+            journaled.frombytes(f_journal.read())
+        for user_id in journaled:
+            if not self.__on_disk(user_id):
+                self.pending.add(user_id)
+
+    def __close(self):
+        if self.view is not None:
+            self.view.release()
+            self.mapped.close()
+        self.view = self.mapped = None
+
+    def __len__(self):
+        on_disk = len(self.view) if self.view is not None else 0
+        return on_disk + len(self.pending)
+
+    def __contains__(self, user_id):
+        return user_id in self.pending or self.__on_disk(user_id)
+
+    def __on_disk(self, user_id):
+        view = self.view
+        if view is None:
+            return False
+        pos = bisect_left(view, user_id)
+        return pos < len(view) and view[pos] == user_id
+
+    def __iter__(self):
+        on_disk = array(TYPECODE, self.view) if self.view is not None \
+            else array(TYPECODE)
+        return iter(self.__merged(on_disk))
+
+    def __merged(self, on_disk):
+        """
+        the file's ids with the pending ones slotted in, still sorted
+        """
+        merged = array(TYPECODE)
+        start = 0
+        for user_id in self.pending:
+            pos = bisect_left(on_disk, user_id, start)
+            merged.extend(on_disk[start:pos])
+            merged.append(user_id)
+            start = pos
+        merged.extend(on_disk[start:])
+        return merged
+
+    def add(self, user_id):
+        """
+        add the id, returns whether it was new
+        """
+        if user_id in self:
+            return False
+        self.pending.add(user_id)
+        self.unjournaled.append(user_id)
+        return True
+
+    def journal(self):
+        """
+        append the ids added since the last call to the journal
+        """
+        if not len(self.unjournaled):
+            return
+        with open(self.journal_path, 'ab') as f_journal:
+            self.unjournaled.tofile(f_journal)
+        self.unjournaled = array(TYPECODE)
+
+    def flush(self):
+        """
+        merge the pending ids into the file
+        """
+        if not len(self.pending):
+            return
+        on_disk = array(TYPECODE, self.view) if self.view is not None \
+            else array(TYPECODE)
+        merged = self.__merged(on_disk)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f_index:
+            merged.tofile(f_index)
+        self.__close()
+        os.replace(tmp_path, self.path)
+        self.pending = IdSet()
+        self.unjournaled = array(TYPECODE)
+        self.__open()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+
+class HandledIds:
+    """
+    followed / unfollowed / liked ids under cached/handled/, with
+    counters of how the lookups were answered
+    """
+
+    def __init__(self, directory=HANDLED):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.indexes = {}
+        self.blooms = {}
+        for kind in (FOLLOWED, UNFOLLOWED, LIKED):
+            index = IdIndex(os.path.join(directory, f'{kind}.ids'))
+            bloom = BloomFilter.load(self.__bloom_path(kind))
+            if bloom is None or bloom.count != len(index):
+                # missing or out of step with the exact index
+                bloom = self.__rebuild(index)
+            self.indexes[kind] = index
+            self.blooms[kind] = bloom
+        # kinds with ids not merged into their file yet (a crashed job's
+        # journal included)
+        self.changed = {kind for kind, index in self.indexes.items()
+                        if len(index.pending)}
+        self.stats = {"bloom_negatives": 0, "hits": 0, "false_positives": 0}
+
+    def seen(self, kind, user_id):
+        """
+        whether the id was recorded for this kind
+        """
+        if user_id not in self.blooms[kind]:
+            self.__count("bloom_negatives", kind)
+            return False
+        if user_id in self.indexes[kind]:
+            self.__count("hits", kind)
+            return True
+        self.__count("false_positives", kind)
+        return False
+
+    def record(self, kind, user_id):
+        """
+        remember that the id was handled
+        """
+        index = self.indexes[kind]
+        if not index.add(user_id):
+            return
+        self.changed.add(kind)
+        bloom = self.blooms[kind]
+        bloom.add(user_id)
+        if bloom.saturated():
+            self.blooms[kind] = self.__rebuild(index)
+
+    def checkpoint(self):
+        """
+        journal the ids recorded since the last checkpoint (cheap, for
+        during a job: only the new ids are written)
+        """
+        for kind in self.changed:
+            self.indexes[kind].journal()
+
+    def save(self):
+        """
+        merge the changed kinds' ids into their files and save their
+        filters (for the end of a job)
+        """
+        for kind in self.changed:
+            self.indexes[kind].flush()
+            self.blooms[kind].save(self.__bloom_path(kind))
+        self.changed = set()
+
+    def __bloom_path(self, kind):
+        return os.path.join(self.directory, f'{kind}.bloom')
+
+    def __count(self, result, kind):
+        self.stats[result] = self.stats[result] + 1
+        metrics.inc("handled_lookups_total", kind=kind, result=result)
+
+    @staticmethod
+    def __rebuild(index):
+        """
+        a filter sized for twice the index, filled from it
+        """
+        bloom = BloomFilter(max(INITIAL_CAPACITY, 2 * len(index)))
+        for user_id in index:
+            bloom.add(user_id)
+        return bloom
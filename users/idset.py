@@ -0,0 +1,109 @@
+"""
+A compact set of user/tweet ids backed by a sorted array of int64,
+instead of a python set of boxed ints
+"""
+from array import array
+from bisect import bisect_left
+
+TYPECODE = 'q'
+
+
+class IdSet:
+    """
+    sorted, de-duplicated int64 ids.  Lookups are binary searches and
+    set operations are linear merges of the two sorted arrays.
+    """
+    __slots__ = ("ids",)
+
+    def __init__(self, ids=()):
+        self.ids = array(TYPECODE, sorted(set(ids)))
+
+    @classmethod
+    def from_sorted(cls, ids):
+        """
+        wrap an array that is already sorted and de-duplicated (no copy)
+        """
+        id_set = cls()
+        id_set.ids = ids
+        return id_set
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, user_id):
+        return self.index(user_id) >= 0
+
+    def __repr__(self):
+        return f'IdSet({len(self.ids)} ids)'
+
+    def index(self, user_id):
+        """
+        position of the id in the array, -1 if it isn't there
+        """
+        pos = bisect_left(self.ids, user_id)
+        if pos < len(self.ids) and self.ids[pos] == user_id:
+            return pos
+        return -1
+
+    def add(self, user_id):
+        """
+        insert the id keeping the array sorted,
+        returns (position, whether it was inserted)
+        """
+        pos = bisect_left(self.ids, user_id)
+        if pos < len(self.ids) and self.ids[pos] == user_id:
+            return (pos, False)
+        self.ids.insert(pos, user_id)
+        return (pos, True)
+
+    def discard(self, user_id):
+        """
+        remove the id if present, returns its old position or -1
+        """
+        pos = self.index(user_id)
+        if pos >= 0:
+            del self.ids[pos]
+        return pos
+
+    def difference(self, other):
+        """
+        ids in this set that are not in the other
+        """
+        mine, theirs = self.ids, other.ids
+        result = array(TYPECODE)
+        i = j = 0
+        while i < len(mine) and j < len(theirs):
+            if mine[i] < theirs[j]:
+                result.append(mine[i])
+                i = i + 1
+            elif mine[i] > theirs[j]:
+                j = j + 1
+            else:
+                i = i + 1
+                j = j + 1
+        result.extend(mine[i:])
+        return IdSet.from_sorted(result)
+
+    def intersection(self, other):
+        """
+        ids present in both sets
+        """
+        mine, theirs = self.ids, other.ids
+        result = array(TYPECODE)
+        i = j = 0
+        while i < len(mine) and j < len(theirs):
+            if mine[i] < theirs[j]:
+                i = i + 1
+            elif mine[i] > theirs[j]:
+                j = j + 1
+            else:
+                result.append(mine[i])
+                i = i + 1
+                j = j + 1
+        return IdSet.from_sorted(result)
+
+    __sub__ = difference
+    __and__ = intersection
@@ -0,0 +1,62 @@
+"""
+Persisted since_id watermarks, so repeated searches only fetch tweets
+newer than the ones already processed
+"""
+import json
+import os
+import time
+
+WATERMARKS = "cached/watermarks.json"
+# trends come and go, a query not searched for this long is forgotten
+MAX_IDLE_SECONDS = 7 * 24 * 60 * 60
+
+
+class Watermarks:
+    """
+    highest tweet id seen per search query (and when the query was last
+    used), persisted as json under cached/
+    """
+
+    def __init__(self, path=WATERMARKS, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.marks = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f_marks:
+                self.marks = json.load(f_marks)
+
+    def since_id(self, query):
+        """
+        the query's watermark, None if it wasn't searched before
+        """
+        mark = self.marks.get(query)
+        if mark is None:
+            return None
+        mark["used"] = self.clock()
+        return mark["since_id"]
+
+    def advance(self, query, tweet_ids):
+        """
+        move the query's watermark up to the newest tweet id returned
+        """
+        if not tweet_ids:
+            return
+        mark = self.marks.setdefault(query, {"since_id": 0})
+        mark["since_id"] = max(mark["since_id"], max(tweet_ids))
+        mark["used"] = self.clock()
+
+    def save(self):
+        """
+        write the watermarks to disk (dropping the ones idle for longer
+        than MAX_IDLE_SECONDS), atomically replacing the old file
+        """
+        oldest = self.clock() - MAX_IDLE_SECONDS
+        self.marks = {query: mark for query, mark in self.marks.items()
+                      if mark["used"] >= oldest}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f_marks:
+            json.dump(self.marks, f_marks, sort_keys=True, indent=4)
+        os.replace(tmp_path, self.path)